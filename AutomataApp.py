@@ -6,11 +6,13 @@
 
 ## Libraries and Dependencies --------------------------------------------------
 import SoundAutomata        ## SoundAutomata Library
+import Rules                ## Used to check custom rules.
+import Score                ## Used to compile the automata into notes.
+import NoteCache            ## Used to keep notes between runs.
+import Mixer                ## Used to mix the notes.
+import Player               ## Used to play the automata.
 import pygame.mixer         ## Used to play audio.
 import random               ## Used for random numbers and selection.
-import time                 ## Used for timing.
-import copy                 ## Used for deep copies.
-import shutil               ## Used to delete files
 import tkFileDialog         ## Used to prompt for file selection.
 import os                   ## Used for files and paths.
 import re                   ## Used to check for valid HEX codes.
@@ -35,7 +37,9 @@ class MainApplication(tk.Frame):
         self.colors = ["grey", "#2579E7"]
         self.seedSize = 6
         self.progression = [0]
-        self.files = set([])
+        self.noteBank = None
+        self.noteCache = NoteCache.NoteCache()
+        self.players = []
         self.seed = np.zeros((self.seedSize,self.seedSize))
         self.file = os.getcwd() + os.path.sep + "pizzicatoc4.wav"
         self.bpm = tk.StringVar(self, value="300")
@@ -43,7 +47,7 @@ class MainApplication(tk.Frame):
         self.noteLengthMax = tk.StringVar(self, value="2000")
         self.noteLengthStep = tk.StringVar(self, value="500")
         self.options = ["Conways", "Up", "Down", "Left", "Right", "No Update",
-            "1D", "Brian's Brain", "Seeds", "Langton's Ant"]
+            "1D", "Brian's Brain", "Seeds", "Langton's Ant", "Custom Rule"]
         self.updateType = tk.StringVar(self, value = self.options[0])
         self.oneDRule = tk.StringVar(self, value = "30")
         self.key = [[-5, -1, 2, 7, 14, 19]]
@@ -91,7 +95,7 @@ class MainApplication(tk.Frame):
             text=self.oneDRule, state = "disabled")
         self.updateOptionsEntry.grid(row = 11, column = 3, sticky="nsew",
             columnspan = 2)
-        self.updateOptionsLabel2 = tk.Label(self, text="1D Rule")
+        self.updateOptionsLabel2 = tk.Label(self, text="1D/Custom Rule")
         self.updateOptionsLabel2.grid(row = 11, column = 5, sticky="nsw")
         self.selectKey = tk.Button(self, text="Select Notes",
             command=self.selectNotes)
@@ -342,9 +346,14 @@ class MainApplication(tk.Frame):
         self.reset()
         if selection == "1D":
             self.updateOptionsEntry.config(state="normal")
+            self.oneDRule.set("30")
             self.colors = ["grey", "#2579E7"]
         elif selection == "Brian's Brain":
             self.colors.append("#1E1E1E")
+        elif selection == "Custom Rule":
+            self.updateOptionsEntry.config(state="normal")
+            self.oneDRule.set("B3/S23")
+            self.colors = ["grey", "#2579E7"]
         elif selection == "Langton's Ant":
             self.colors = ["grey", "#2579E7"]
             for i in range(8):
@@ -354,13 +363,11 @@ class MainApplication(tk.Frame):
             self.updateOptionsEntry.config(state="disabled")
             self.colors = ["grey", "#2579E7"]
 
-    ## Cleans up all extra files generated during runtime.
+    ## Forgets the notes generated during runtime.
     def wipe(self, *args):
-        if not self.files == set():
-            for i in self.files:
-                if os.path.exists(i[:-4]):
-                    shutil.rmtree(i[:-4])
-                self.files = set([])
+        if self.noteBank is not None:
+            self.noteBank.close()
+        self.noteBank = None
 
     ## Function that opens a window to select the audio file to be used
     ## by the automata.
@@ -418,7 +425,10 @@ class MainApplication(tk.Frame):
                     var=(row,column) :self.onObjectClick(event,var))
 
     ## Function that creates an instance of the SoundAutomata and
-    ## VisualizerWindow classes and drives their execution. Primary function.
+    ## VisualizerWindow classes and starts their playback. Primary function.
+    ## The automata is compiled into a score as it plays, and the Tk event
+    ## loop plays it (see Player.py), so create returns at once and more
+    ## automata can be created while it plays.
     def create(self):
         self.write("Initializing new Musical Automata...")
         if self.keyOptionVal.get() == "Generated Chords":
@@ -427,49 +437,39 @@ class MainApplication(tk.Frame):
             if int(self.oneDRule.get()) > 255 or int(self.oneDRule.get()) < 0:
                 self.oneDRule.set(30)
                 self.write("There are only 0-255 rules! Resetting to default.")
+        if self.updateType.get() == "Custom Rule":
+            if not Rules.isRule(self.oneDRule.get()):
+                self.oneDRule.set("B3/S23")
+                self.write("Rules look like B3/S23 or B2/S/C3! Resetting to "
+                    + "default.")
+            states = Rules.compileRule(self.oneDRule.get()).states
+            self.colors = self.colors[:2] + ["#1E1E1E"]*(states - 2)
+        if len(self.key) <= max(self.progression):
+            self.write("Not enough chords for the progression!")
+            return
+
         window = VisualizerWindow(self, self.seed, self.seedSize,
             self.cellwidth)
         self.parent.update()
         bpm = float(60)/float(self.bpmEntry.get())
-        start_time = 0
-        self.files.add(self.file)
         soundGenerator = SoundAutomata.SoundAutomata(self, self.seed, self.file,
-            self.key, self.lengthCheckVal.get(), self.windowSizeVal.get())
-        progPos = 0
-        for i in range(self.cyclesEntryVal.get()):
-            if len(self.key) <= max(self.progression):
-                self.write("Not enough chords for the progression!")
-                break
-            try:
-                for j in range(self.seedSize):
-                    window.update(soundGenerator.gameBoard,
-                        (soundGenerator.currentNote-1)%self.seedSize)
-                    while (time.time() - start_time) < bpm:
-                        pass
-
-                    soundGenerator.play(random.choice(range(int(
-                        self.noteLengthMin.get()),
-                        int(self.noteLengthMax.get())+1,
-                        int(self.noteLengthStep.get()))),
-                        self.toPlayScale.get(), self.playCheckVal.get())
-
-                    start_time = time.time()
-                    if (self.updateType.get() == "1D" or self.updateType.get()
-                        == "Langton's Ant"):
-                        soundGenerator.update(self.updateType.get(),
-                            self.oneDRule.get())
-
-                if not (self.updateType.get() == "1D" or self.updateType.get()
-                    == "Langton's Ant"):
-                    soundGenerator.update(self.updateType.get(),
-                        self.oneDRule.get())
-                if self.keyOptionVal.get() != "Single Chord":
-                    progPos = (progPos + 1)%len(self.progression)
-                    soundGenerator.updateKey(progPos)
-            except Exception as e:
-                pass
-
-        window.destroy()
+            self.key, self.lengthCheckVal.get(), self.windowSizeVal.get(),
+            noteBank = self.noteBank, noteCache = self.noteCache)
+        self.noteBank = soundGenerator.noteBank
+        producer = Score.BeatProducer(soundGenerator, self.updateType.get(),
+            self.oneDRule.get(), self.cyclesEntryVal.get(), bpm,
+            range(int(self.noteLengthMin.get()),
+            int(self.noteLengthMax.get())+1, int(self.noteLengthStep.get())),
+            self.toPlayScale.get(), self.playCheckVal.get(), self.progression,
+            self.keyOptionVal.get() != "Single Chord")
+        mixer = Mixer.Mixer(Mixer.PygameSink(),
+            soundGenerator.noteBank.samplerate())
+        player = Player.Player(self, producer, mixer, soundGenerator.noteSample,
+            bpm, window.update, self.write)
+        window.attach(player)
+        self.players = [old for old in self.players if old.active()]
+        self.players.append(player)
+        player.start()
 
     ## Callback function that adjusts the seed when a box is clicked.
     def onObjectClick(self, event, (row, column)):
@@ -484,16 +484,20 @@ class MainApplication(tk.Frame):
                 self.seedSelect.itemconfigure("rect"+str(i)+"x"+str(j),
                     fill=self.colors[int(self.seed[i][j])])
 
-    ## Overload of the destroy function. Calls the wipe function to clean up
-    ## all files created during runtime when the application is closed.
+    ## Overload of the destroy function. Calls the wipe function to free the
+    ## notes generated during runtime when the application is closed.
     def destroy(self):
+        for player in self.players:
+            player.stop()
         self.wipe()
         self.quit()
 
 
 ## -----------------------------------------------------------------------------
 ## VisualizerWindow ------------------------------------------------------------
-## Class that governs the visualizer of the cellular automata.
+## Class that governs the visualizer of the cellular automata. Keeps its own
+## copy of the colors, so changing them for the next automata does not touch
+## one that is playing.
 class VisualizerWindow(tk.Toplevel):
     ## Class constructor. Initializes values and GUI elements.
     def __init__(self, parent, seed, seedSize, cellwidth):
@@ -502,10 +506,10 @@ class VisualizerWindow(tk.Toplevel):
         self.seed = seed
         self.cellwidth = cellwidth
         self.seedSize = seedSize
+        self.colors = list(self.parent.colors)
         self.visualizer = tk.Canvas(self, width = self.parent.canvasSize,
             height = self.parent.canvasSize)
         self.visualizerArray = {}
-        self.visualizerSeed = copy.deepcopy(self.seed)
         self.visualizer.pack()
         for column in range(self.seedSize):
             for row in range(self.seedSize):
@@ -515,8 +519,62 @@ class VisualizerWindow(tk.Toplevel):
                 y2 = y1 + self.cellwidth
                 self.visualizerArray[row,column] = (
                     self.visualizer.create_rectangle(x1,y1,x2,y2,
-                    fill=self.parent.colors[int(self.seed[row][column])],
+                    fill=self.colors[int(self.seed[row][column])],
                     tags="rectVis"+str(row)+str(column)))
+        self.controls = tk.Frame(self)
+        self.controls.pack(fill="x")
+        self.pauseButton = tk.Button(self.controls, text="Pause",
+            command=self.pause)
+        self.pauseButton.pack(side="left")
+        self.stopButton = tk.Button(self.controls, text="Stop",
+            command=self.stop)
+        self.stopButton.pack(side="left")
+        self.bpm = tk.StringVar(self, value=self.parent.bpm.get())
+        self.bpm.trace("w", self.updateBpm)
+        self.bpmLabel = tk.Label(self.controls, text="BPM")
+        self.bpmLabel.pack(side="right")
+        self.bpmEntry = tk.Entry(self.controls, textvariable=self.bpm,
+            width=6)
+        self.bpmEntry.pack(side="right")
+        self.player = None
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    ## Sets the player this window shows and controls.
+    def attach(self, player):
+        self.player = player
+
+    ## Pauses the player, or starts it again if it is paused.
+    def pause(self):
+        if self.player.state == "playing":
+            self.player.pause()
+            self.pauseButton.config(text="Play")
+        elif self.player.state == "paused":
+            self.player.start()
+            self.pauseButton.config(text="Pause")
+
+    ## Stops the player for good.
+    def stop(self):
+        if self.player is not None:
+            self.player.stop()
+        self.pauseButton.config(state="disabled")
+        self.stopButton.config(state="disabled")
+
+    ## Stops the player and closes the window.
+    def close(self):
+        if self.player is not None:
+            self.player.stop()
+        self.destroy()
+
+    ## Changes the tempo of the player while it plays. Ignores anything that
+    ## is not a positive number.
+    def updateBpm(self, *args):
+        try:
+            bpm = float(self.bpm.get())
+        except ValueError:
+            return
+
+        if bpm > 0 and self.player is not None:
+            self.player.setInterval(float(60)/bpm)
 
     ## Updates the visual based on changes caused by cellular automata changes.
     def update(self, newSeed, currentNote):
@@ -524,7 +582,7 @@ class VisualizerWindow(tk.Toplevel):
             for column in range(self.seedSize):
                 if newSeed[row][column]:
                     self.visualizer.itemconfig(self.visualizerArray[row,column],
-                        fill=self.parent.colors[int(newSeed[row][column])])
+                        fill=self.colors[int(newSeed[row][column])])
                 else:
                     if row == currentNote:
                         self.visualizer.itemconfig(
@@ -532,9 +590,7 @@ class VisualizerWindow(tk.Toplevel):
                     else:
                         self.visualizer.itemconfig(
                             self.visualizerArray[row,column],
-                            fill=self.parent.colors[0])
-
-        self.parent.parent.update()
+                            fill=self.colors[0])
 
 
 ## -----------------------------------------------------------------------------
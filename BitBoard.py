@@ -0,0 +1,216 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## BitBoard.py
+
+## Contains the BitBoard class. A bit packed board for the automata that only
+## have dead and alive cells: two state rules, the slides and 1D.
+
+## Libraries and Dependencies --------------------------------------------------
+import sys                          ## Used to check the byte order.
+
+import numpy as np                  ## Used for arrays.
+
+## Bit Constants ---------------------------------------------------------------
+ONE = np.uint64(1)
+HIGH = np.uint64(63)
+
+## Every byte with its bits in reverse order. packbits and unpackbits put the
+## first cell in the highest bit, the board keeps it in the lowest.
+REVERSED = np.packbits(np.unpackbits(np.arange(256, dtype=np.uint8)[:,None],
+    axis=1)[:,::-1], axis=1).reshape(-1)
+
+## -----------------------------------------------------------------------------
+## BitBoard --------------------------------------------------------------------
+## Keeps a square torus as rows of 64 bit words, so one word holds 64 cells and
+## a whole board takes an eighth of the memory of a uint8 board. Cell (i, j) is
+## bit j % 64 of word j // 64 in row i. Bits past the edge of the board are
+## always 0. Neighbors are counted with bitwise adders on whole words, and
+## every intermediate plane has its own preallocated buffer.
+class BitBoard(object):
+    ## Class constructor. Packs the alive cells (state 1) of board.
+    def __init__(self, board):
+        self.size = len(board)
+        self.words = (self.size + 63) // 64
+        self.edge = np.uint64((self.size - 1) % 64)
+        self.lastMask = np.uint64(2**((self.size - 1) % 64 + 1) - 1)
+        shape = (self.size, self.words)
+        self.rows = np.zeros(shape, dtype=np.uint64)
+        self.rowsTemp = np.zeros(shape, dtype=np.uint64)
+        self.vertical = np.zeros(shape, dtype=np.uint64)
+        self.plane = np.zeros(shape, dtype=np.uint64)
+        self.carry = np.zeros(shape, dtype=np.uint64)
+        self.temp = np.zeros(shape, dtype=np.uint64)
+        self.sums = np.zeros((4,) + shape, dtype=np.uint64)
+        self.match = np.zeros(shape, dtype=np.uint64)
+        self.result = np.zeros(shape, dtype=np.uint64)
+        self.load(board)
+
+    ## The bytes of rows as (rows, words, 8), least significant byte of each
+    ## word first.
+    def wordBytes(self, rows):
+        packedBytes = rows.view(np.uint8).reshape(len(rows), self.words, 8)
+        if sys.byteorder == "big":
+            packedBytes = packedBytes[:,:,::-1]
+        return packedBytes
+
+    ## Packs the alive cells of board into the rows, one byte per 8 cells.
+    def load(self, board):
+        packed = np.zeros((self.size, self.words * 8), dtype=np.uint8)
+        packed[:,:(self.size + 7) // 8] = np.packbits(np.asarray(board) == 1,
+            axis=1)
+        self.wordBytes(self.rows)[...] = REVERSED[packed].reshape(self.size,
+            self.words, 8)
+
+    ## Unpacks rows into 0s and 1s, all self.size columns of them.
+    def unpackRows(self, rows):
+        packedBytes = REVERSED[self.wordBytes(rows)].reshape(len(rows), -1)
+        return np.unpackbits(packedBytes, axis=1)[:,:self.size]
+
+    ## Unpacks the board into out as 0s and 1s.
+    def unpack(self, out):
+        out[...] = self.unpackRows(self.rows)
+
+    ## Returns the columns of the alive cells in a row.
+    def rowIndices(self, row):
+        return np.flatnonzero(self.unpackRows(self.rows[row:row+1])[0])
+
+    ## Makes the freshly written rowsTemp the current rows.
+    def swap(self):
+        self.rows, self.rowsTemp = self.rowsTemp, self.rows
+
+    ## Copies source shifted by one column into out, wrapping at the edges.
+    ## With shift 1 cell j of out is cell j-1 of source, with -1 it is j+1.
+    def shiftColumns(self, source, shift, out):
+        carry = self.carry[:len(source)]
+        if shift > 0:
+            np.left_shift(source, ONE, out=out)
+            np.right_shift(source[:,:-1], HIGH, out=carry[:,:-1])
+            np.bitwise_or(out[:,1:], carry[:,:-1], out=out[:,1:])
+            np.right_shift(source[:,-1], self.edge, out=carry[:,-1])
+            np.bitwise_and(carry[:,-1], ONE, out=carry[:,-1])
+            np.bitwise_or(out[:,0], carry[:,-1], out=out[:,0])
+            np.bitwise_and(out[:,-1], self.lastMask, out=out[:,-1])
+        else:
+            np.right_shift(source, ONE, out=out)
+            np.left_shift(source[:,1:], HIGH, out=carry[:,1:])
+            np.bitwise_or(out[:,:-1], carry[:,1:], out=out[:,:-1])
+            np.bitwise_and(source[:,0], ONE, out=carry[:,0])
+            np.left_shift(carry[:,0], self.edge, out=carry[:,0])
+            np.bitwise_or(out[:,-1], carry[:,0], out=out[:,-1])
+
+    ## Copies source shifted by one row into out, wrapping at the edges.
+    ## With shift 1 row i of out is row i-1 of source, with -1 it is i+1.
+    def shiftRows(self, source, shift, out):
+        if shift > 0:
+            np.copyto(out[1:], source[:-1])
+            np.copyto(out[0], source[-1])
+        else:
+            np.copyto(out[:-1], source[1:])
+            np.copyto(out[-1], source[0])
+
+    ## Adds a plane of single bits into the 4 bit counters held in self.sums,
+    ## one ripple carry adder per bit.
+    def addPlane(self, plane):
+        carry = self.temp
+        np.copyto(carry, plane)
+        for bit in self.sums:
+            np.bitwise_and(bit, carry, out=self.match)
+            np.bitwise_xor(bit, carry, out=bit)
+            np.copyto(carry, self.match)
+
+    ## Adds the three cells of every row of source centered on each column
+    ## into the counters, leaving out the center cell if skipCenter is set.
+    def addRow(self, source, skipCenter):
+        self.shiftColumns(source, 1, self.plane)
+        self.addPlane(self.plane)
+        self.shiftColumns(source, -1, self.plane)
+        self.addPlane(self.plane)
+        if not skipCenter:
+            self.addPlane(source)
+
+    ## Counts the alive neighbors of every cell into the bit planes of
+    ## self.sums, least significant bit first.
+    def countNeighbors(self):
+        self.sums.fill(0)
+        if self.size == 1:
+            return self.sums
+
+        self.shiftRows(self.rows, 1, self.vertical)
+        self.addRow(self.vertical, False)
+        self.shiftRows(self.rows, -1, self.vertical)
+        self.addRow(self.vertical, False)
+        self.addRow(self.rows, True)
+        return self.sums
+
+    ## Sets out to the cells whose neighbor count is in counts.
+    def countsIn(self, counts, out):
+        out.fill(0)
+        for count in counts:
+            self.match.fill(~np.uint64(0))
+            for bit in range(4):
+                if (count >> bit) & 1:
+                    np.bitwise_and(self.match, self.sums[bit], out=self.match)
+                else:
+                    np.invert(self.sums[bit], out=self.temp)
+                    np.bitwise_and(self.match, self.temp, out=self.match)
+
+            np.bitwise_or(out, self.match, out=out)
+
+    ## Updates the board by a compiled two state rule (see Rules.py).
+    def ruleUpdate(self, rule):
+        self.countNeighbors()
+        born = self.result
+        self.countsIn(rule.birth, born)
+        np.invert(self.rows, out=self.vertical)
+        np.bitwise_and(born, self.vertical, out=born)
+        self.countsIn(rule.survive, self.rowsTemp)
+        np.bitwise_and(self.rowsTemp, self.rows, out=self.rowsTemp)
+        np.bitwise_or(self.rowsTemp, born, out=self.rowsTemp)
+        np.bitwise_and(self.rowsTemp[:,-1], self.lastMask,
+            out=self.rowsTemp[:,-1])
+        self.swap()
+
+    ## Slides the board by one cell along axis (0 is down, 1 is right for a
+    ## positive shift), wrapping at the edges.
+    def slide(self, shift, axis):
+        if axis == 0:
+            self.shiftRows(self.rows, shift, self.rowsTemp)
+        else:
+            self.shiftColumns(self.rows, shift, self.rowsTemp)
+        self.swap()
+
+    ## Computes row from the row above it by a 1-D rule table (see
+    ## SoundAutomata.oneDTable). Each neighborhood value whose entry is 1
+    ## adds the cells whose (left, center, right) bits match it.
+    def oneDRow(self, table, row):
+        prev = self.rows[(row - 1) % self.size][None]
+        left = self.plane[:1]
+        right = self.vertical[:1]
+        self.shiftColumns(prev, 1, left)
+        self.shiftColumns(prev, -1, right)
+        out = self.result[:1]
+        out.fill(0)
+        match = self.match[:1]
+        temp = self.temp[:1]
+        for pattern in range(8):
+            if not table[pattern]:
+                continue
+
+            match.fill(~np.uint64(0))
+            for bit, cells in ((4, left), (2, prev), (1, right)):
+                if pattern & bit:
+                    np.bitwise_and(match, cells, out=match)
+                else:
+                    np.invert(cells, out=temp)
+                    np.bitwise_and(match, temp, out=match)
+
+            np.bitwise_or(out, match, out=out)
+
+        np.bitwise_and(out[:,-1], self.lastMask, out=out[:,-1])
+        np.copyto(self.rows[row], out[0])
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
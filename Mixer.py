@@ -0,0 +1,277 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Mixer.py
+
+## Contains the Mixer class and its sinks. Mixes note events (see Score.py)
+## into blocks of samples itself, so every note starts on its exact sample
+## with its own volume, and hands the blocks to a sink: the sound card, a .wav
+## file or nothing at all.
+
+## Libraries and Dependencies --------------------------------------------------
+import wave                         ## Used to open/save .wav files.
+import time                         ## Used for timing.
+import heapq                        ## Used to keep notes in time order.
+import threading                    ## Used to mix in the background.
+
+import numpy as np                  ## Used for arrays.
+import pygame.mixer as pgm          ## Used to play/initialize audio.
+import pygame.sndarray as pgsa      ## Used to create sounds out of arrays.
+
+## -----------------------------------------------------------------------------
+## Mixer -----------------------------------------------------------------------
+## Mixes scheduled notes into int16 blocks of blockSize samples and writes them
+## to a sink. Block i holds the samples from i * blockSize on, counted from the
+## start of the piece (time 0 of the events). Each note is a voice that plays
+## its samples from its onset, scaled by its own gain, until its duration is
+## up or it runs out. At most polyphony voices play at once (see VoicePool).
+## Notes may be scheduled from another thread while the mixer runs in its own
+## (see start).
+class Mixer(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, sink, samplerate = 44100, blockSize = 1024,
+        channels = 2, polyphony = 64, steal = "oldest"):
+        self.sink = sink
+        self.samplerate = samplerate
+        self.blockSize = blockSize
+        self.channels = channels
+        self.pending = []
+        self.order = 0
+        self.voices = VoicePool(polyphony, steal)
+        self.position = 0
+        self.out = np.zeros((blockSize, channels))
+        self.block = np.zeros((blockSize, channels), dtype=np.int16)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    ## Schedules note events. sample(key, note) returns the samples of a note,
+    ## shape (samples, channels), and is called right away, in this thread.
+    def schedule(self, events, sample):
+        notes = []
+        for event in events:
+            onset = int(round(event["time"] * self.samplerate))
+            length = int(event["duration"]) * self.samplerate // 1000
+            notes.append((onset, sample(event["key"], event["note"]),
+                float(event["volume"]), length))
+
+        with self.lock:
+            for onset, samples, gain, length in notes:
+                heapq.heappush(self.pending, (onset, self.order, samples, gain,
+                    length))
+                self.order += 1
+
+    ## Forgets every scheduled note that has not started yet.
+    def clear(self):
+        with self.lock:
+            self.pending = []
+
+    ## Starts the notes due before sample end. Notes that were due earlier
+    ## start at the beginning of the block.
+    def startVoices(self, end):
+        with self.lock:
+            while self.pending and self.pending[0][0] < end:
+                onset, order, samples, gain, length = heapq.heappop(
+                    self.pending)
+                self.voices.add(samples[:length], gain,
+                    max(onset - self.position, 0), order)
+
+    ## Mixes the next block and returns it. The block is reused by the next
+    ## call.
+    def render(self):
+        end = self.position + self.blockSize
+        self.startVoices(end)
+        self.out.fill(0)
+        self.voices.mix(self.out)
+        self.position = end
+        np.clip(self.out, -32768, 32767, out=self.out)
+        self.block[...] = self.out
+        return self.block
+
+    ## Returns whether nothing is playing or scheduled.
+    def idle(self):
+        return not self.pending and self.voices.count() == 0
+
+    ## Mixes blocks into the sink until seconds into the piece are covered.
+    def renderUntil(self, seconds):
+        while self.position < seconds * self.samplerate:
+            self.sink.write(self.render())
+
+    ## Mixes blocks into the sink until every scheduled note has finished.
+    def renderAll(self):
+        while not self.idle():
+            self.sink.write(self.render())
+
+    ## Starts mixing into the sink from a background thread, as fast as the
+    ## sink takes the blocks.
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    ## Body of the background thread.
+    def run(self):
+        while self.running:
+            self.sink.write(self.render())
+
+    ## Stops the background thread, once every scheduled note has finished
+    ## if wait is set, and closes the sink.
+    def stop(self, wait = False):
+        while wait and self.running and not self.idle():
+            time.sleep(float(self.blockSize) / self.samplerate)
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.sink.close()
+
+## -----------------------------------------------------------------------------
+## VoicePool -------------------------------------------------------------------
+## The voices of a mixer, in polyphony slots made up front. When every slot is
+## taken, a new note steals the slot of the oldest voice (steal "oldest"), or
+## of the quietest one (steal "quietest"), or is dropped (steal None), so a
+## dense board loses the notes it can spare instead of random ones. stolen and
+## dropped count the notes lost each way.
+class VoicePool(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, polyphony = 64, steal = "oldest"):
+        if steal not in ("oldest", "quietest", None):
+            raise ValueError("Unknown voice stealing: " + str(steal))
+
+        self.polyphony = polyphony
+        self.steal = steal
+        self.samples = [None] * polyphony
+        self.played = np.zeros(polyphony, dtype=np.int64)
+        self.gain = np.zeros(polyphony)
+        self.offset = np.zeros(polyphony, dtype=np.int64)
+        self.order = np.zeros(polyphony, dtype=np.int64)
+        self.active = np.zeros(polyphony, dtype=bool)
+        self.stolen = 0
+        self.dropped = 0
+
+    ## Number of voices playing.
+    def count(self):
+        return int(self.active.sum())
+
+    ## Starts a voice playing samples, scaled by gain, offset samples into the
+    ## next block. order ranks voices by age, lowest first. Returns whether
+    ## the voice got a slot.
+    def add(self, samples, gain, offset, order):
+        free = np.flatnonzero(~self.active)
+        if len(free):
+            slot = free[0]
+        elif self.steal is None or self.polyphony == 0:
+            self.dropped += 1
+            return False
+        else:
+            if self.steal == "oldest":
+                slot = np.argmin(self.order)
+            else:
+                slot = np.argmin(self.gain)
+            self.stolen += 1
+
+        self.samples[slot] = samples
+        self.played[slot] = 0
+        self.gain[slot] = gain
+        self.offset[slot] = offset
+        self.order[slot] = order
+        self.active[slot] = len(samples) > 0
+        return True
+
+    ## Adds the next block of every voice into out and frees the slots of
+    ## voices that finished.
+    def mix(self, out):
+        for slot in np.flatnonzero(self.active):
+            samples = self.samples[slot]
+            played = self.played[slot]
+            offset = self.offset[slot]
+            count = min(len(out) - offset, len(samples) - played)
+            out[offset:offset+count] += (samples[played:played+count] *
+                self.gain[slot])
+            self.played[slot] = played + count
+            self.offset[slot] = 0
+            if self.played[slot] >= len(samples):
+                self.active[slot] = False
+                self.samples[slot] = None
+
+    ## Lost notes as a line for the message box.
+    def report(self):
+        return (str(self.stolen) + " notes stolen, " + str(self.dropped) +
+            " dropped (" + str(self.polyphony) + " voices).")
+
+## -----------------------------------------------------------------------------
+## Sinks -----------------------------------------------------------------------
+## Takes blocks and throws them away, counting the samples. For running the
+## mixer without a sound card.
+class NullSink(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self):
+        self.samples = 0
+
+    ## Takes a block.
+    def write(self, block):
+        self.samples += len(block)
+
+    ## Nothing to close.
+    def close(self):
+        pass
+
+## Writes blocks to a 16 bit .wav file.
+class WaveSink(object):
+    ## Class constructor. Opens the file.
+    def __init__(self, path, samplerate = 44100, channels = 2):
+        self.outFile = wave.open(path, 'w')
+        self.outFile.setframerate(samplerate)
+        self.outFile.setnchannels(channels)
+        self.outFile.setsampwidth(2)
+
+    ## Writes a block.
+    def write(self, block):
+        self.outFile.writeframes(block.tobytes())
+
+    ## Closes the file.
+    def close(self):
+        self.outFile.close()
+
+## Plays blocks through one reserved pygame mixer channel, queueing each
+## block behind the one playing. write waits while a block is already
+## queued, which keeps the mixer just ahead of the sound card. Every sink
+## takes its own channel, the lowest one free unless one is given, so several
+## mixers can play at once.
+class PygameSink(object):
+    ## Channels taken by open sinks.
+    taken = set()
+
+    ## Class constructor. Reserves the channel so Sound.play never takes it.
+    def __init__(self, channel = None, poll = 0.001):
+        if channel is None:
+            channel = 0
+            while channel in PygameSink.taken:
+                channel += 1
+        PygameSink.taken.add(channel)
+        pgm.set_reserved(max(PygameSink.taken) + 1)
+        self.number = channel
+        self.channel = pgm.Channel(channel)
+        self.poll = poll
+
+    ## Queues a block, waiting for room.
+    def write(self, block):
+        sound = pgsa.make_sound(block.copy())
+        while self.channel.get_queue() is not None:
+            time.sleep(self.poll)
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+        else:
+            self.channel.play(sound)
+
+    ## Lets the blocks already queued play out and frees the channel.
+    def close(self):
+        while self.channel.get_busy():
+            time.sleep(self.poll)
+        PygameSink.taken.discard(self.number)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
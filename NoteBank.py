@@ -0,0 +1,205 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## NoteBank.py
+
+## Contains the NoteBank class. Generates the pitch shifted notes of a sound
+## and keeps them in memory.
+
+## Libraries and Dependencies --------------------------------------------------
+import multiprocessing              ## Used to generate in parallel.
+import threading                    ## Used to generate in the background.
+import paulstretch                  ## Used to stretch audio.
+import Resample                     ## Used to pitch shift audio.
+
+import numpy as np                  ## Used for arrays.
+import pygame.mixer as pgm          ## Used to play/initialize audio.
+
+## -----------------------------------------------------------------------------
+## NoteBank --------------------------------------------------------------------
+## Keeps the notes generated from one sound, by pitch (semitones from the
+## original). Each pitch is generated once and shared by every chord and key
+## that uses it. Notes are kept as int16 arrays of shape (samples, channels)
+## and handed to the mixer straight from memory. With a NoteCache
+## the notes generated in earlier runs are loaded instead of generated again,
+## and new ones are saved to it. Missing notes are generated across a pool of
+## worker processes (one per core unless workers is given), or one at a time
+## if workers is 1. The pool is started once per bank, on the first batch, and
+## gets the decoded sound once, when it starts. Notes are pitch shifted at one
+## of the quality tiers of Resample.py. Notes can be generated
+## from a background thread while the bank is in use, one batch at a time.
+## New notes are saved to the cache once saveBatch of them are waiting, and
+## the rest by flush.
+class NoteBank(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, parent, sound, lengthAdjusted = False,
+        windowSize = 0.5, cache = None, workers = None, quality = "sinc"):
+        self.parent = parent
+        self.basicNote = sound
+        self.lengthAdjusted = lengthAdjusted
+        self.windowSize = windowSize
+        self.quality = quality
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.samples = {}
+        self.source = None
+        self.lock = threading.Lock()
+        self.cache = cache
+        self.cacheKey = None
+        self.unsaved = 0
+        self.saveBatch = 12
+        self.pool = None
+        if cache is not None:
+            self.cacheKey = cache.key(sound, lengthAdjusted, windowSize,
+                self.samplerate(), quality)
+            self.samples = cache.load(self.cacheKey)
+
+    ## Returns whether the bank was made from this sound with these settings.
+    def matches(self, sound, lengthAdjusted, windowSize, cache = None):
+        return (self.basicNote == sound and self.cache is cache and
+            bool(self.lengthAdjusted) == bool(lengthAdjusted) and
+            (not lengthAdjusted or self.windowSize == windowSize))
+
+    ## Generates every pitch that is not in the bank yet. Progress is written
+    ## to the parent if report is set, which only the GUI thread may do.
+    def generate(self, pitches, report = True):
+        with self.lock:
+            self.generateMissing(pitches, report)
+
+    ## Generates every pitch that is not in the bank yet, with the lock held.
+    def generateMissing(self, pitches, report):
+        missing = [i for i in sorted(set(pitches)) if i not in self.samples]
+        if not missing:
+            return
+
+        if report:
+            self.parent.write("Generating notes...")
+        (rate,smp) = self.decode()
+        settings = (rate, smp, self.lengthAdjusted, self.windowSize,
+            self.samplerate(), self.quality)
+        if self.workers <= 1 or len(missing) <= 1:
+            for i in missing:
+                self.add(i, renderNote(i, *settings), report)
+        else:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.workers, initWorker,
+                    (settings,))
+            for i, note in self.pool.imap_unordered(renderPitch, missing):
+                self.add(i, note, report)
+
+        self.unsaved += len(missing)
+        if self.unsaved >= self.saveBatch:
+            self.save()
+
+    ## Saves the notes to the cache if any are not saved yet.
+    def flush(self):
+        with self.lock:
+            if self.unsaved:
+                self.save()
+
+    ## Saves every note to the cache, with the lock held.
+    def save(self):
+        if self.cache is not None:
+            self.cache.save(self.cacheKey, self.samples)
+        self.unsaved = 0
+
+    ## Stops the worker processes. A later batch starts them again.
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
+
+    ## Returns the source sound as (samplerate, samples), opened on first use
+    ## and kept for every later pitch and key. The samples are memory mapped
+    ## from the file as it stores them (see paulstretch.open_wav), so only the
+    ## parts a note reads are loaded, and never as float64 all at once.
+    def decode(self):
+        if self.source is None:
+            self.source = paulstretch.open_wav(self.basicNote)
+            if self.source is None:
+                raise IOError("Could not load " + self.basicNote)
+
+        return self.source
+
+    ## Adds a generated note to the bank and reports it.
+    def add(self, pitch, samples, report = True):
+        self.samples[pitch] = samples
+        if report:
+            self.parent.write(self.parent.notes[pitch%len(self.parent.notes)] +
+            "(" + str(pitch//len(self.parent.notes)+5) + ") Generated!")
+
+    ## Sample rate the notes are generated at: that of the mixer, which
+    ## pygame converts every Sound to.
+    def samplerate(self):
+        init = pgm.get_init()
+        if init is None:
+            return 44100
+
+        return init[0]
+
+    ## Starts generating pitches in a background thread, without reporting,
+    ## and returns the thread (None if they are all in the bank already).
+    def prefetch(self, pitches):
+        if all(i in self.samples for i in pitches):
+            return None
+
+        thread = threading.Thread(target=self.generate, args=(pitches, False))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    ## Returns the samples of a pitch, generating it if needed.
+    def sample(self, pitch):
+        if pitch not in self.samples:
+            self.generate([pitch])
+
+        return self.samples[pitch]
+
+## -----------------------------------------------------------------------------
+## Functions -------------------------------------------------------------------
+## Settings of the bank a worker process generates notes for (the arguments of
+## renderNote after the pitch), set once when the process starts.
+workerSettings = None
+
+## Keeps the settings in a new worker process.
+def initWorker(settings):
+    global workerSettings
+    workerSettings = settings
+
+## Generates a pitch in a worker process and returns it with its samples.
+def renderPitch(pitch):
+    return pitch, renderNote(pitch, *workerSettings)
+
+## Generates a pitch from a sound (samples of shape (channels, samples) at
+## rate, as paulstretch.open_wav returns) as int16 samples of shape (samples,
+## channels) at samplerate, resampled at quality. Sound length can be
+## normalized, in which case the pitch is shifted in one paulstretch pass that
+## keeps the length and only the sample rate is converted afterwards. The
+## sound is not changed, so it can be shared by every pitch.
+def renderNote(pitch, rate, smp, lengthAdjusted, windowSize, samplerate,
+    quality = "sinc"):
+    factor = 2**(1.0 * pitch / 12.0)
+    if lengthAdjusted:
+        smp = paulstretch.pitch_array(rate, smp, factor, windowSize)
+        factor = 1.0
+
+    if smp.dtype == np.int16:
+        note = np.array(smp.T)
+    else:
+        if smp.dtype != np.float64:
+            smp = paulstretch.to_float(smp, np.empty(smp.shape))
+        note = np.clip(np.round(smp.T * 32768.0), -32768, 32767).astype(
+            np.int16)
+    factor = factor * rate / samplerate
+    if factor != 1.0:
+        note = Resample.resample(note, factor, quality)
+
+    return note.copy(order='C')
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
@@ -0,0 +1,115 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## NoteCache.py
+
+## Contains the NoteCache class. Keeps generated notes on disk between runs, so
+## the same instrument only has to be generated once.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for files and paths.
+import hashlib                      ## Used to hash sounds.
+import tempfile                     ## Used to write files atomically.
+
+import numpy as np                  ## Used for arrays.
+
+## Cache Defaults --------------------------------------------------------------
+## Where the cache lives and how large it may grow (bytes).
+CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".soundautomata",
+    "notes")
+CACHE_BYTES = 256 * 2**20
+
+## -----------------------------------------------------------------------------
+## NoteCache -------------------------------------------------------------------
+## A content addressed store of note banks. Each bank is one .npz file named by
+## a hash of the source sound's bytes and every setting the notes depend on
+## (stretching, window size, sample rate, resampling quality), holding one
+## array per pitch. Files are touched whenever they are read, and the least
+## recently used ones are removed once the cache grows past maxBytes.
+class NoteCache(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, directory = CACHE_DIRECTORY, maxBytes = CACHE_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+
+    ## Returns the key of the notes generated from a sound with the given
+    ## settings. The window size only matters when the length is adjusted.
+    def key(self, sound, lengthAdjusted, windowSize, samplerate,
+        quality = "sinc"):
+        digest = hashlib.sha1()
+        with open(sound, 'rb') as soundFile:
+            for block in iter(lambda: soundFile.read(2**20), b''):
+                digest.update(block)
+
+        if not lengthAdjusted:
+            windowSize = None
+        digest.update(repr((bool(lengthAdjusted), windowSize,
+            int(samplerate), str(quality))).encode('ascii'))
+        return digest.hexdigest()
+
+    ## Path of the file holding a key.
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    ## Returns the cached notes of a key as {pitch: samples}, empty if there
+    ## are none or the file can not be read.
+    def load(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return {}
+
+        try:
+            with np.load(path) as cached:
+                samples = dict((int(name), cached[name])
+                    for name in cached.files)
+            os.utime(path, None)
+        except Exception:
+            return {}
+
+        return samples
+
+    ## Stores the notes of a key, and evicts old files if the cache is too
+    ## large. The notes are written to a temporary file of their own that is
+    ## then renamed over the old file, so readers always find a whole file
+    ## (on POSIX, where rename replaces atomically).
+    def save(self, key, samples):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        path = self.path(key)
+        handle, temp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as tempFile:
+                np.savez(tempFile, **dict((str(pitch), note)
+                    for pitch, note in samples.items()))
+            os.rename(temp, path)
+        except Exception:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self.evict(path)
+
+    ## Removes the least recently used files until the cache fits in
+    ## maxBytes. The file at keep is never removed.
+    def evict(self, keep = None):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.npz') and path != keep:
+                files.append((os.path.getmtime(path), os.path.getsize(path),
+                    path))
+
+        total = sum(size for used, size, path in files)
+        if keep is not None and os.path.exists(keep):
+            total += os.path.getsize(keep)
+        for used, size, path in sorted(files):
+            if total <= self.maxBytes:
+                break
+
+            os.remove(path)
+            total -= size
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
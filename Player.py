@@ -0,0 +1,180 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Player.py
+
+## Contains the Player class. Plays a piece from the Tk event loop, so the
+## application keeps responding while the automata plays, and several can play
+## at once.
+
+## Libraries and Dependencies --------------------------------------------------
+import threading                    ## Used to let notes ring out.
+
+import Scheduler                    ## Used to keep playback on the beat.
+import Score                        ## Used for the queue of beats.
+
+## -----------------------------------------------------------------------------
+## Player ----------------------------------------------------------------------
+## Plays the beats of a BeatProducer through a Mixer. Nothing here ever waits:
+## each tick is run by widget.after, handles whatever is due and asks to be run
+## again when the next beat is due. A beat's notes are handed to the mixer as
+## soon as the beat before it is drawn, timed by the scheduler instead of the
+## score, so the tempo can change while playing and pausing just moves every
+## deadline. draw(frame, row) shows a beat, write(string) takes the reports
+## and the messages of the automata.
+class Player(object):
+    ## Class constructor. Initializes all values. The first beat is due lead
+    ## seconds after playback starts, which leaves the mixer time to mix it.
+    def __init__(self, widget, producer, mixer, sample, interval, draw,
+        write = None, lead = 0.1, poll = 0.005):
+        self.widget = widget
+        self.producer = producer
+        self.mixer = mixer
+        self.sample = sample
+        self.draw = draw
+        self.write = write
+        self.lead = lead
+        self.poll = poll
+        self.scheduler = Scheduler.BeatScheduler(interval)
+        self.state = "ready"
+        self.next = None
+        self.job = None
+        self.clockOrigin = 0.0
+        self.mixerOrigin = 0.0
+
+    ## Starts playback, or carries on after a pause.
+    def start(self):
+        if self.state == "ready":
+            self.producer.start()
+            self.mixer.start()
+        elif self.state != "paused":
+            return
+
+        self.clockOrigin = Scheduler.clock()
+        self.mixerOrigin = float(self.mixer.position) / self.mixer.samplerate
+        self.scheduler.restart(self.clockOrigin + self.lead)
+        self.state = "playing"
+        if self.next is not None:
+            self.scheduleNext()
+        self.tick()
+
+    ## Pauses playback. Notes already sounding ring out, the next beat's are
+    ## taken back from the mixer until playback starts again.
+    def pause(self):
+        if self.state != "playing":
+            return
+
+        self.state = "paused"
+        self.cancel()
+        self.mixer.clear()
+
+    ## Stops playback for good and writes the reports. Notes already sounding
+    ## ring out in the background.
+    def stop(self):
+        if self.state == "stopped":
+            return
+
+        started = self.state != "ready"
+        self.state = "stopped"
+        self.cancel()
+        if not started:
+            return
+
+        self.producer.stop()
+        self.mixer.clear()
+        finish = threading.Thread(target=self.mixer.stop, args=(True,))
+        finish.daemon = True
+        finish.start()
+        if self.write is not None:
+            self.write(self.scheduler.report())
+            self.write(self.mixer.voices.report())
+
+    ## Stops playback after an error, from the producer or while drawing or
+    ## scheduling a beat, and reports it.
+    def fail(self, error):
+        if self.write is not None:
+            self.write("Playback stopped! " + type(error).__name__ + ": " +
+                str(error))
+        self.stop()
+
+    ## Changes the time between beats (seconds) from the beat after the next
+    ## one on. The next beat's notes are already with the mixer.
+    def setInterval(self, interval):
+        self.scheduler.setInterval(interval)
+
+    ## Returns whether playback has started and not stopped.
+    def active(self):
+        return self.state in ("playing", "paused")
+
+    ## Forgets the pending tick, if there is one.
+    def cancel(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+    ## Time on the mixer's clock of a time on the scheduler's.
+    def mixerTime(self, time):
+        return time - self.clockOrigin + self.mixerOrigin
+
+    ## Hands the next beat's notes to the mixer, due at the next deadline.
+    def scheduleNext(self):
+        events = self.next[1].copy()
+        events["time"] = self.mixerTime(self.scheduler.deadline(
+            self.scheduler.beat))
+        self.mixer.schedule(events, self.sample)
+
+    ## Takes the next beat from the producer if there is none yet and it is
+    ## ready, writing any messages that came before it. Returns False once
+    ## the piece is over.
+    def fetch(self):
+        while self.next is None:
+            try:
+                beat = self.producer.get(False)
+            except Score.Queue.Empty:
+                return True
+
+            if beat is None:
+                return False
+
+            if isinstance(beat, str):
+                if self.write is not None:
+                    self.write(beat)
+                continue
+
+            self.next = beat
+            self.scheduleNext()
+
+        return True
+
+    ## Draws the next beat if it is due and schedules the next tick. Any error
+    ## stops playback (see fail).
+    def tick(self):
+        self.job = None
+        if self.state != "playing":
+            return
+
+        try:
+            if self.next is not None and self.scheduler.remaining() <= 0:
+                self.scheduler.advance()
+                beat = self.next
+                self.next = None
+                self.draw(beat[2], beat[3])
+            more = self.fetch()
+        except Exception as e:
+            self.fail(e)
+            return
+
+        if not more:
+            self.stop()
+            return
+
+        if self.next is None:
+            wait = self.poll
+        else:
+            wait = self.scheduler.remaining()
+        self.job = self.widget.after(max(int(wait * 1000), 1), self.tick)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
@@ -0,0 +1,203 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Render.py
+
+## Contains the offline renderer. Mixes a compiled score (see Score.py) into a
+## single buffer and writes it to a .wav file, without an audio device and far
+## faster than real time. Long pieces can instead be streamed to disk block by
+## block in constant memory.
+
+## Libraries and Dependencies --------------------------------------------------
+import wave                         ## Used to open/save .wav files.
+import SoundAutomata                ## Used to run the automata.
+import Score                        ## Used to compile the automata.
+
+import numpy as np                  ## Used for arrays.
+import pygame.mixer as pgm          ## Used to generate the notes.
+
+## -----------------------------------------------------------------------------
+## Console ---------------------------------------------------------------------
+## Stands in for the application when rendering without a window: the
+## messages of the automata are printed.
+class Console(object):
+    notes = ["C", "C#/Df", "D", "D#/Ef", "E", "F", "F#/Gf", "G", "G#/Af", "A",
+        "A#/Bf", "B"]
+
+    ## Prints a message.
+    def write(self, string):
+        print(string)
+
+## -----------------------------------------------------------------------------
+## Functions -------------------------------------------------------------------
+## Returns the generated notes of an automata from its note bank, as int16
+## arrays of shape (samples, channels) laid out [chord][note] like its key,
+## and the sample rate they were generated at. Missing notes are generated in
+## one batch and saved to the cache.
+def noteSamples(automata):
+    bank = automata.noteBank
+    bank.generate([pitch for chord in automata.key for pitch in chord], False)
+    bank.flush()
+    return ([[bank.sample(pitch) for pitch in chord]
+        for chord in automata.key], bank.samplerate())
+
+## Adds sample into out once for every onset (in samples), scaled by gains.
+## Few onsets are added one slice at a time. Many onsets of the same sample
+## are added at once as a convolution of their impulse train with the sample,
+## done with one FFT, whichever is cheaper.
+def overlapAdd(out, sample, onsets, gains):
+    length = len(sample)
+    first = onsets.min()
+    span = onsets.max() - first + length
+    size = 1 << int(np.ceil(np.log2(span + length)))
+    if len(onsets) * length <= 3 * size * np.log2(size):
+        for onset, gain in zip(onsets, gains):
+            out[onset:onset+length] += sample * gain
+        return
+
+    impulses = np.zeros(span)
+    np.add.at(impulses, onsets - first, gains)
+    spectrum = np.fft.rfft(impulses, size)[:,None] * np.fft.rfft(sample,
+        size, axis=0)
+    out[first:first+span] += np.fft.irfft(spectrum, size, axis=0)[:span]
+
+## Mixes every event of a score into one float buffer of shape (samples,
+## channels), at the sample rate of the notes. Notes are cut off after their
+## duration, like pygame.mixer.Sound.play(0, duration) does. Events playing
+## the same note for the same duration are overlap-added together.
+def mixScore(score, notes, samplerate):
+    events = score.events
+    channels = notes[0][0].shape[1] if notes and notes[0] else 2
+    onsets = np.round(events["time"] * samplerate).astype(int)
+    lengths = events["duration"].astype(int) * samplerate // 1000
+    groups = {}
+    for i in range(len(events)):
+        sample = notes[events["key"][i]][events["note"][i]]
+        length = min(len(sample), lengths[i])
+        groups.setdefault((events["key"][i], events["note"][i], length),
+            []).append(i)
+
+    end = int(round(score.beats * score.interval * samplerate))
+    for (key, note, length), indexes in groups.items():
+        end = max(end, onsets[indexes].max() + length)
+
+    out = np.zeros((end, channels))
+    for (key, note, length), indexes in groups.items():
+        if length > 0:
+            overlapAdd(out, notes[key][note][:length].astype(np.float64),
+                onsets[indexes], events["volume"][indexes])
+
+    return out
+
+## Writes a mixed buffer to a 16 bit .wav file. Samples past full scale are
+## clipped, as the real time mixer does, unless normalize is set, in which case
+## the whole piece is scaled to fit.
+def writeWav(path, buffer, samplerate, normalize = False):
+    if normalize and len(buffer):
+        peak = np.abs(buffer).max()
+        if peak > 32767:
+            buffer = buffer * (32767.0 / peak)
+
+    outFile = wave.open(path, 'w')
+    outFile.setframerate(samplerate)
+    outFile.setnchannels(buffer.shape[1])
+    outFile.setsampwidth(2)
+    outFile.writeframes(np.clip(buffer, -32768, 32767).astype(
+        np.int16).tobytes())
+    outFile.close()
+
+## Renders a compiled score to a .wav file, at the sample rate of the notes.
+def renderWav(score, notes, path, samplerate, normalize = False):
+    writeWav(path, mixScore(score, notes, samplerate), samplerate, normalize)
+
+## Streams beats from Score.scoreBeats (or any (time, events, ...) tuples in
+## time order) into a .wav file at the sample rate of the notes. Notes are
+## mixed into a ring of blocks of blockSize samples, just long enough to hold
+## the longest note, and each block is written out and reused as soon as no
+## later note can reach it, so memory stays the same however long the piece
+## is. Samples past full scale are clipped. The file is padded with silence
+## to length seconds if given.
+def streamWav(beats, notes, path, samplerate, blockSize = 4096,
+    length = None):
+    channels = notes[0][0].shape[1] if notes and notes[0] else 2
+    longest = max([len(sample) for chord in notes for sample in chord] + [1])
+    ring = np.zeros(((longest // blockSize + 2) * blockSize, channels))
+    head = 0
+    base = 0
+    end = 0
+    outFile = wave.open(path, 'w')
+    outFile.setframerate(samplerate)
+    outFile.setnchannels(channels)
+    outFile.setsampwidth(2)
+
+    ## Writes the oldest block of the ring and frees it for later samples.
+    def flush():
+        block = ring[head:head+blockSize]
+        outFile.writeframes(np.clip(block, -32768, 32767).astype(
+            np.int16).tobytes())
+        block.fill(0)
+        return (head + blockSize) % len(ring), base + blockSize
+
+    for beat in beats:
+        events = beat[1]
+        if len(events) == 0:
+            continue
+
+        onsets = np.round(events["time"] * samplerate).astype(int)
+        lengths = events["duration"].astype(int) * samplerate // 1000
+        while onsets.min() >= base + blockSize:
+            head, base = flush()
+
+        for i in range(len(events)):
+            sample = notes[events["key"][i]][events["note"][i]]
+            sample = sample[:min(len(sample), lengths[i])] * float(
+                events["volume"][i])
+            start = (head + onsets[i] - base) % len(ring)
+            split = min(len(sample), len(ring) - start)
+            ring[start:start+split] += sample[:split]
+            ring[:len(sample)-split] += sample[split:]
+            end = max(end, onsets[i] + len(sample))
+
+    if length is not None:
+        end = max(end, int(round(length * samplerate)))
+    while base + blockSize <= end:
+        head, base = flush()
+    if end > base:
+        block = ring[head:head+end-base]
+        outFile.writeframes(np.clip(block, -32768, 32767).astype(
+            np.int16).tobytes())
+
+    outFile.close()
+
+## Runs an automata and streams the piece to a .wav file, without a window,
+## for batch use. Takes the settings of the application: the seed board, the
+## sound file, the key (a list of chords of pitches) and the progression
+## through it, which moves on after every cycle if changeKey is set, the
+## update type and rule, the number of cycles, the beats per minute, the note
+## lengths (ms) to pick from and the most notes played per beat. Messages go
+## to parent (printed if not given).
+def renderAutomata(path, seed, sound, key, progression = [0],
+    changeKey = False, updateType = "Conways", oneDRule = "30", cycles = 4,
+        bpm = 120, noteLengths = [500], num = 4, lengthAdjusted = False,
+            windowSize = 0.5, parent = None):
+    if parent is None:
+        parent = Console()
+    if pgm.get_init() is None:
+        pgm.init(44100, -16, 2, 4069)
+    automata = SoundAutomata.SoundAutomata(parent, np.asarray(seed), sound,
+        key, lengthAdjusted, windowSize)
+    try:
+        notes, samplerate = noteSamples(automata)
+        beats = Score.scoreBeats(automata, updateType, oneDRule, cycles,
+            60.0 / bpm, noteLengths, num, True, list(progression), changeKey)
+        streamWav(beats, notes, path, samplerate)
+    finally:
+        automata.noteBank.close()
+
+    for message in automata.takeMessages():
+        parent.write(message)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
@@ -0,0 +1,104 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Resample.py
+
+## Contains the resampler used to pitch shift notes. Speeds audio up or slows
+## it down by any factor, at one of a few quality tiers.
+
+## Libraries and Dependencies --------------------------------------------------
+import numpy as np                  ## Used for arrays.
+
+## Quality Tiers ---------------------------------------------------------------
+## fast: nearest sample, the cheapest, but aliases at high pitches.
+## linear: linear interpolation between the two nearest samples.
+## sinc: band limited windowed sinc interpolation, without aliasing.
+QUALITIES = ["fast", "linear", "sinc"]
+
+## Zero crossings of the sinc kept on each side, and the number of fractional
+## positions (phases) its filters are computed for.
+SINC_ZEROS = 8
+SINC_PHASES = 256
+
+## -----------------------------------------------------------------------------
+## Functions -------------------------------------------------------------------
+## Speeds up samples (along the first axis, with any number of channels) by a
+## factor, so the result is len(samples)/factor long and factor times higher.
+## Integer samples are returned rounded and clipped to their own type.
+def resample(samples, factor, quality = "fast"):
+    if quality == "fast":
+        return nearest(samples, factor)
+    elif quality == "linear":
+        out = linear(samples, factor)
+    elif quality == "sinc":
+        out = sinc(samples, factor)
+    else:
+        raise ValueError("Unknown resampling quality: " + str(quality))
+
+    if np.issubdtype(samples.dtype, np.integer):
+        limits = np.iinfo(samples.dtype)
+        out = np.clip(np.round(out), limits.min, limits.max)
+
+    return out.astype(samples.dtype)
+
+## Positions in samples of every output sample.
+def positions(length, factor):
+    where = np.arange(0, length, factor)
+    return where[where < length]
+
+## Takes the nearest sample to every position.
+def nearest(samples, factor):
+    indices = np.round(positions(len(samples), factor))
+    indices = indices[indices < len(samples)].astype(int)
+    return samples[indices]
+
+## Interpolates linearly between the two samples around every position. The
+## sample after the last one is taken as silence.
+def linear(samples, factor):
+    where = positions(len(samples), factor)
+    indices = where.astype(int)
+    fraction = (where - indices).reshape((-1,) + (1,) * (samples.ndim - 1))
+    padded = np.concatenate((samples, np.zeros((1,) + samples.shape[1:],
+        dtype=samples.dtype)))
+    return (padded[indices] * (1.0 - fraction) +
+        padded[indices + 1] * fraction)
+
+## Returns the polyphase filter bank of a windowed sinc with a cutoff (as a
+## fraction of the Nyquist frequency) and half its width in samples. Row p is
+## the filter for a position p / SINC_PHASES past a sample, with taps for the
+## samples from half - 1 before it to half after it. Each row sums to 1.
+def sincFilters(cutoff, half):
+    taps = np.arange(2 * half) - half + 1
+    distance = taps[None,:] - np.arange(SINC_PHASES)[:,None] / float(
+        SINC_PHASES)
+    window = np.where(np.abs(distance) < half, 0.42 +
+        0.5 * np.cos(np.pi * distance / half) +
+            0.08 * np.cos(2 * np.pi * distance / half), 0.0)
+    filters = np.sinc(cutoff * distance) * window
+    return filters / filters.sum(axis=1)[:,None]
+
+## Interpolates every position with a windowed sinc. When speeding up, the
+## cutoff is lowered by the factor so nothing above the new Nyquist frequency
+## folds back. All channels and positions are filtered at once, one tap at a
+## time.
+def sinc(samples, factor):
+    cutoff = min(1.0, 1.0 / factor)
+    half = int(np.ceil(SINC_ZEROS / cutoff))
+    filters = sincFilters(cutoff, half)
+    where = positions(len(samples), factor)
+    phases = np.round(where * SINC_PHASES).astype(np.int64)
+    indices = phases // SINC_PHASES
+    phases %= SINC_PHASES
+    padded = np.concatenate((np.zeros((half,) + samples.shape[1:]),
+        samples, np.zeros((half + 1,) + samples.shape[1:])))
+    shape = (-1,) + (1,) * (samples.ndim - 1)
+    out = np.zeros((len(where),) + samples.shape[1:])
+    for tap in range(2 * half):
+        out += padded[indices + tap + 1] * filters[phases, tap].reshape(shape)
+
+    return out
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
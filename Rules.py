@@ -0,0 +1,90 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Rules.py
+
+## Contains the rule compiler for outer totalistic cellular automata. Rules
+## are written in B/S notation, like "B3/S23" for Conway's Game of Life, or in
+## Generations notation, like "B2/S/C3" for Brian's Brain.
+
+## Libraries and Dependencies --------------------------------------------------
+import re                           ## Used to parse rule strings.
+
+import numpy as np                  ## Used for arrays.
+
+## Named Rules -----------------------------------------------------------------
+## Update types that are just outer totalistic rules.
+NAMED_RULES = {"Conways": "B3/S23", "Seeds": "B2/S",
+    "Brian's Brain": "B2/S/C3"}
+
+## Rules that have already been compiled, by notation.
+compiledRules = {}
+
+## -----------------------------------------------------------------------------
+## Rule ------------------------------------------------------------------------
+## A compiled outer totalistic rule. Cells in state 1 are alive and are the
+## only ones counted as neighbors. Dead cells (0) with a birth count become
+## alive, alive cells with a survival count stay alive. In Generations rules
+## (C > 2) alive cells that do not survive start dying, stepping through
+## states 2 to C-1 before they are dead again. Boards are uint8, so C is at
+## most 256.
+class Rule(object):
+    ## Parses the notation and builds the lookup table.
+    def __init__(self, notation):
+        match = re.match(r'^B([0-8]*)/S([0-8]*)(?:/C([0-9]+))?$',
+            notation.strip().upper())
+        if not match or (match.group(3) and
+            not 2 <= int(match.group(3)) <= 256):
+            raise ValueError("Not a valid rule: " + notation)
+
+        self.notation = notation
+        self.birth = set(map(int, match.group(1)))
+        self.survive = set(map(int, match.group(2)))
+        self.states = int(match.group(3) or 2)
+        self.table = self.buildTable()
+
+    ## Builds the lookup table of the rule. Entry state * 9 + count is the next
+    ## state of a cell in that state with count alive neighbors. Unknown
+    ## states are left alone, except that in two state rules every state but
+    ## 1 is treated as dead and can be born.
+    def buildTable(self):
+        table = np.zeros((256, 9), dtype=np.uint8)
+        table[:] = np.arange(256)[:,None]
+        for count in range(9):
+            table[0,count] = 1 if count in self.birth else 0
+            if count in self.survive:
+                table[1,count] = 1
+            else:
+                table[1,count] = 2 if self.states > 2 else 0
+
+            if self.states == 2:
+                if count in self.birth:
+                    table[2:,count] = 1
+
+        for state in range(2, self.states):
+            table[state] = (state + 1) % self.states
+
+        return table.reshape(-1)
+
+## -----------------------------------------------------------------------------
+## Functions -------------------------------------------------------------------
+## Returns whether the string is written in B/S or Generations notation.
+def isRule(notation):
+    try:
+        compileRule(notation)
+        return True
+    except ValueError:
+        return False
+
+## Compiles a rule, or a named update type, once and returns it.
+def compileRule(notation):
+    notation = NAMED_RULES.get(notation, notation)
+    if notation not in compiledRules:
+        compiledRules[notation] = Rule(notation)
+
+    return compiledRules[notation]
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
@@ -0,0 +1,89 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Scheduler.py
+
+## Contains the BeatScheduler class. Keeps playback on the beat without
+## spinning the processor.
+
+## Libraries and Dependencies --------------------------------------------------
+import time                         ## Used for timing.
+
+## Clock -----------------------------------------------------------------------
+## A clock that never jumps backwards, where there is one (Python 3).
+try:
+    clock = time.monotonic
+except AttributeError:
+    clock = time.time
+
+## -----------------------------------------------------------------------------
+## BeatScheduler ---------------------------------------------------------------
+## Times beats that are interval seconds apart for an event loop. Every beat
+## has a fixed deadline counted from the first one, so time spent between
+## beats never adds up into drift. The scheduler tells how long until the next
+## beat is due, and how late each beat was is kept for the lateness
+## statistics.
+class BeatScheduler(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, interval, clock = clock):
+        self.interval = interval
+        self.clock = clock
+        self.origin = None
+        self.beat = 0
+        self.beats = 0
+        self.totalLateness = 0.0
+        self.maxLateness = 0.0
+
+    ## Deadline of a beat on the clock. The first beat is due when remaining
+    ## is first asked, unless restart set it.
+    def deadline(self, beat):
+        return self.origin + beat * self.interval
+
+    ## Seconds until the next beat is due, negative once it is late. The
+    ## first beat is due at once.
+    def remaining(self):
+        if self.origin is None:
+            self.origin = self.clock()
+
+        return self.deadline(self.beat) - self.clock()
+
+    ## Moves on to the next beat, counting how late the current one was
+    ## (seconds), which is returned.
+    def advance(self):
+        lateness = max(-self.remaining(), 0.0)
+        self.beat += 1
+        self.beats += 1
+        self.totalLateness += lateness
+        self.maxLateness = max(self.maxLateness, lateness)
+        return lateness
+
+    ## Changes the time between beats from the next beat on, keeping the
+    ## deadline of the next beat where it is.
+    def setInterval(self, interval):
+        if self.origin is not None:
+            self.origin += self.beat * (self.interval - interval)
+        self.interval = interval
+
+    ## Starts counting beats again, with the next one due at origin on the
+    ## clock, or at once if origin is None.
+    def restart(self, origin = None):
+        self.origin = origin
+        self.beat = 0
+
+    ## Mean and largest lateness of the beats so far (seconds).
+    def lateness(self):
+        if self.beats == 0:
+            return 0.0, 0.0
+
+        return self.totalLateness / self.beats, self.maxLateness
+
+    ## Lateness statistics as a line for the message box.
+    def report(self):
+        mean, largest = self.lateness()
+        return ("Beats were " + str(round(mean * 1000, 2)) + "ms late on " +
+            "average, " + str(round(largest * 1000, 2)) + "ms at most.")
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
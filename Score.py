@@ -0,0 +1,226 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## Score.py
+
+## Contains the Score class and the score compiler. Runs the automata ahead of
+## time and keeps every note it plays in an event list, so playback does no
+## automata work.
+
+## Libraries and Dependencies --------------------------------------------------
+import random                       ## Used to pick note lengths.
+import threading                    ## Used to run the automata ahead.
+try:
+    import queue as Queue           ## Used to hand beats between threads.
+except ImportError:
+    import Queue
+
+import numpy as np                  ## Used for arrays.
+
+## Event Type ------------------------------------------------------------------
+## One note: when it starts (seconds), the chord (key) and the note in that
+## chord it plays, its volume and how long it rings (milliseconds).
+EVENT = np.dtype([("time", np.float64), ("key", np.int16), ("note", np.int16),
+    ("volume", np.float32), ("duration", np.int32)])
+
+## Update types that update once per row instead of once per board.
+ROW_UPDATES = ["1D", "Langton's Ant"]
+
+## -----------------------------------------------------------------------------
+## Score -----------------------------------------------------------------------
+## A compiled piece. Events are sorted by time, and beatStarts[i] is the index
+## of the first event of beat i. frames[i] and rows[i] are the board and the
+## highlighted row shown on beat i, if frames were kept.
+class Score(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, events, beatStarts, interval, frames = None,
+        rows = None):
+        self.events = events
+        self.beatStarts = beatStarts
+        self.interval = interval
+        self.beats = len(beatStarts) - 1
+        self.frames = frames
+        self.rows = rows
+
+    ## Returns the events that start on a beat.
+    def beatEvents(self, beat):
+        return self.events[self.beatStarts[beat]:self.beatStarts[beat+1]]
+
+    ## Length of the piece in seconds, until the last note stops ringing.
+    def length(self):
+        end = self.beats * self.interval
+        if len(self.events):
+            end = max(end, np.max(self.events["time"] +
+                self.events["duration"] / 1000.0))
+
+        return end
+
+## -----------------------------------------------------------------------------
+## BeatProducer ----------------------------------------------------------------
+## Runs scoreBeats in a background thread, lookahead beats ahead of playback.
+## Beats are handed over through a bounded queue, so the automata never runs
+## further ahead than that, and a slow step only delays playback once the
+## lookahead is used up. Messages of the automata (see takeMessages) are
+## handed over the same way, ahead of the beat they came up on, so only the
+## thread taking the beats writes them. The notes of each beat are generated
+## before it is handed over, so playback never waits on the note bank, and
+## notes still waiting to be cached are saved once the thread ends (in a
+## thread of their own that the application waits for on exit). Takes the
+## same arguments as scoreBeats. The progression is copied, so editing it
+## does not reach a piece that is playing.
+class BeatProducer(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, automata, updateType, oneDRule, cycles, interval,
+        noteLengths, num, musicCheck = True, progression = [0],
+            changeKey = False, keepFrames = True, lookahead = 8):
+        self.beats = scoreBeats(automata, updateType, oneDRule, cycles,
+            interval, noteLengths, num, musicCheck, list(progression),
+                changeKey, keepFrames)
+        if lookahead < 1:
+            raise ValueError("Lookahead must be at least one beat: " +
+                str(lookahead))
+
+        self.automata = automata
+        self.queue = Queue.Queue(lookahead)
+        self.running = False
+        self.thread = None
+
+    ## Starts running the automata.
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    ## Body of the background thread. Ends the queue with None, or with the
+    ## exception that stopped it.
+    def run(self):
+        try:
+            for beat in self.beats:
+                if not self.running:
+                    return
+                self.automata.generateEvents(beat[1])
+                for message in self.automata.takeMessages():
+                    self.queue.put(message)
+                self.queue.put(beat)
+        except Exception as e:
+            self.queue.put(e)
+            return
+        finally:
+            flush = threading.Thread(target=self.automata.noteBank.flush)
+            flush.daemon = False
+            flush.start()
+
+        self.queue.put(None)
+
+    ## Returns the next beat as (time, events, frame, row), a message for the
+    ## message box (a string), or None once the piece is over. Waits for the
+    ## beat if it is not ready yet, unless block is not set, in which case
+    ## Queue.Empty is raised.
+    def get(self, block = True):
+        beat = self.queue.get(block)
+        if isinstance(beat, Exception):
+            raise beat
+
+        return beat
+
+    ## Stops the background thread.
+    def stop(self):
+        self.running = False
+        while self.thread is not None and self.thread.is_alive():
+            try:
+                self.queue.get(True, 0.01)
+            except Queue.Empty:
+                pass
+
+        self.thread = None
+
+## -----------------------------------------------------------------------------
+## Functions -------------------------------------------------------------------
+## Runs the automata for a number of cycles (one pass over every row of the
+## board each) the same way AutomataApp does, yielding (time, events, frame,
+## row) for every beat, where frame is a copy of the board shown on that beat
+## and row its highlighted row (None unless keepFrames is set). noteLengths
+## are the note lengths (ms) to pick from on each beat, num is the most notes
+## played per beat. The progression moves on after every cycle if changeKey
+## is set. Stops early if the key does not have enough chords for the
+## progression. Only one beat is computed at a time, so pieces of any length
+## can be streamed.
+def scoreBeats(automata, updateType, oneDRule, cycles, interval,
+    noteLengths, num, musicCheck = True, progression = [0], changeKey = False,
+        keepFrames = False):
+    size = automata.size
+    beat = 0
+    progPos = 0
+    for i in range(cycles):
+        if len(automata.key) <= max(progression):
+            break
+
+        for j in range(size):
+            frame = None
+            row = None
+            if keepFrames:
+                frame = automata.gameBoard.copy()
+                row = (automata.currentNote-1)%size
+
+            duration = random.choice(noteLengths)
+            events = np.zeros(0, dtype=EVENT)
+            if musicCheck:
+                notes, volumes = automata.selectNotes(num)
+                events = np.zeros(len(notes), dtype=EVENT)
+                events["time"] = beat * interval
+                events["key"] = automata.currentKey
+                events["note"] = notes
+                events["volume"] = volumes
+                events["duration"] = duration
+
+            yield (beat * interval, events, frame, row)
+            beat += 1
+            automata.advance()
+            if updateType in ROW_UPDATES:
+                automata.update(updateType, oneDRule)
+
+        if updateType not in ROW_UPDATES:
+            automata.update(updateType, oneDRule)
+        if changeKey:
+            progPos = (progPos + 1)%len(progression)
+            automata.updateKey(progression[progPos],
+                progression[(progPos + 1)%len(progression)])
+
+## Runs the automata like scoreBeats and returns the whole piece as a Score.
+## Messages of the automata are written to its parent once it is done.
+def compileScore(automata, updateType, oneDRule, cycles, interval,
+    noteLengths, num, musicCheck = True, progression = [0], changeKey = False,
+        keepFrames = True):
+    events = []
+    beatStarts = [0]
+    frames = []
+    rows = []
+    for time, beatEvents, frame, row in scoreBeats(automata, updateType,
+        oneDRule, cycles, interval, noteLengths, num, musicCheck, progression,
+            changeKey, keepFrames):
+        events.append(beatEvents)
+        beatStarts.append(beatStarts[-1] + len(beatEvents))
+        frames.append(frame)
+        rows.append(row)
+
+    for message in automata.takeMessages():
+        automata.parent.write(message)
+    if keepFrames and frames:
+        frames = np.array(frames)
+        rows = np.array(rows)
+    else:
+        frames = None
+        rows = None
+
+    if events:
+        events = np.concatenate(events)
+    else:
+        events = np.zeros(0, dtype=EVENT)
+
+    return Score(events, np.array(beatStarts), interval, frames, rows)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script. It will tell you not to do that.
+if __name__ == "__main__":
+    print("Don't run me! Run AutomataApp.py!")
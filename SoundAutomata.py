@@ -7,276 +7,427 @@
 
 ## Libraries and Dependencies --------------------------------------------------
 import time                         ## Used for timing.
-import wave                         ## Used to open/save .wav files.
-import os                           ## Used for file paths.
-import copy                         ## Used for deep copies.
 import math                         ## Used for math constants.
-import paulstretch                  ## Used to stretch audio.
-import random                       ## Used to pick notes to play.
+import NoteBank                     ## Used to keep generated notes.
+import Rules                        ## Used to compile automata rules.
+import BitBoard                     ## Used for bit packed boards.
+import hashlib                      ## Used to hash board states.
+try:
+    import tracemalloc              ## Used to measure step allocations.
+except ImportError:
+    tracemalloc = None
 
 import numpy as np                  ## Used for arrays.
-import pygame.mixer as pgm          ## Used to play/initialize audio.
-import pygame.sndarray as pgsa      ## Used to create arrays out of sounds.
+
+## Langton's Ant Tables --------------------------------------------------------
+## Row and column step for each ant heading (down, left, up, right), and the
+## state an ant takes when it lands on a dead [0] or alive [1] cell.
+LANGTON_ROW_STEP = np.array([1, 0, -1, 0])
+LANGTON_COLUMN_STEP = np.array([0, -1, 0, 1])
+LANGTON_ARRIVALS = np.array([[9, 6, 7, 8], [3, 4, 5, 2]])
+
+## Slides ----------------------------------------------------------------------
+## Shift and axis of each slide update.
+SLIDES = {"Up": (-1, 0), "Down": (1, 0), "Left": (-1, 1), "Right": (1, 1)}
 
 ## -----------------------------------------------------------------------------
 ## SoundAutomata ---------------------------------------------------------------
 ## Governs the cellular automata and audio generation.
-class SoundAutomata:
+class SoundAutomata(object):
     ## Class constructor. Initializes all values.
+    ## The board lives in two preallocated uint8 buffers. Updates write the
+    ## next generation into the back buffer and swap, and every intermediate
+    ## array has its own scratch buffer, so stepping allocates nothing. With
+    ## packed set, two state automata are kept in a BitBoard instead and the
+    ## uint8 board is only filled in when it is read. Seeds with other states
+    ## are never packed.
     def __init__(self, parent, seed = np.random.randint(2,size = (4,4)),
         sound = "sinec4.wav", key = [[0,4,7,12]], lengthAdjusted = False,
-            windowSize = 0.5):
+            windowSize = 0.5, packed = False, noteBank = None,
+                noteCache = None, history = True):
         self.parent = parent
-        self.gameBoard = seed
         self.lengthAdjusted = lengthAdjusted
         self.windowSize = windowSize
         self.basicNote = sound
-        if not os.path.exists(self.basicNote[:-4]):
-            os.mkdir(self.basicNote[:-4])
-        self.size = len(self.gameBoard[1])
-        self.gameBoardTemp = copy.deepcopy(self.gameBoard)
-        self.key = key
-        self.generateNotes()
-        self.noteArray = []
-        for i in self.key:
-            self.noteArray.append([pgm.Sound(self.basicNote[:-4] + "/" + str(j)
-                + ".wav") for j in i])
+        if noteBank is None or not noteBank.matches(sound, lengthAdjusted,
+            windowSize, noteCache):
+            noteBank = NoteBank.NoteBank(parent, sound, lengthAdjusted,
+                windowSize, noteCache)
+        self.noteBank = noteBank
+        self.size = len(seed)
+        self.boards = None
+        self.bits = None
+        self.bitsChanged = False
+        if packed and np.all((np.asarray(seed) == 0) |
+            (np.asarray(seed) == 1)):
+            self.bits = BitBoard.BitBoard(seed)
+        else:
+            self.allocateBoards()
+            self.boards[0] = seed
+        self.oneDRule = None
+        self.oneDRuleTable = None
+        self.ants = None
+        self.key = [list(chord) for chord in key]
         self.currentNote = 0
         self.currentKey = 0
-
-    ## Helper function to count the amount of neighbors in a cells Moore
-    ## neighborhood.
-    def countneighbors(self, x, y):
-        count = 0
-        for i in range(x-1,x+2):
-            for j in range(y-1,y+2):
-                curx = i % self.size
-                cury = j % self.size
-                if self.organismAt(curx, cury) and (curx != x or cury != y):
-                    count += 1
-
+        self.prefetch(0)
+        self.messages = []
+        self.keepHistory = history
+        self.historySteps = 2**16
+        self.historyLimit = 2**26
+        self.forget()
+
+    ## Allocates the two uint8 boards and the scratch buffers of the updates.
+    def allocateBoards(self):
+        self.boards = np.zeros((2, self.size, self.size), dtype=np.uint8)
+        self.front = 0
+        self.padded = np.zeros((self.size+2, self.size+2), dtype=np.uint8)
+        self.count = np.zeros((self.size, self.size), dtype=np.uint8)
+        self.mask = np.zeros((self.size, self.size), dtype=bool)
+        self.maskTemp = np.zeros((self.size, self.size), dtype=bool)
+        self.index = np.zeros((self.size, self.size), dtype=np.intp)
+        self.row = np.zeros(self.size+2, dtype=np.intp)
+        self.rowTemp = np.zeros(self.size, dtype=np.intp)
+
+    ## The current generation of the board. A packed board is unpacked into
+    ## the uint8 board first if it changed since it was last read.
+    @property
+    def gameBoard(self):
+        if self.bits is not None and (self.boards is None or self.bitsChanged):
+            if self.boards is None:
+                self.allocateBoards()
+            self.bits.unpack(self.boards[self.front])
+            self.bitsChanged = False
+
+        return self.boards[self.front]
+
+    ## The buffer the next generation is written into.
+    @property
+    def gameBoardTemp(self):
+        return self.boards[1 - self.front]
+
+    ## Returns the columns of the occupied cells in a row and their states.
+    ## Packed boards are read straight from the bits. While a cycle is being
+    ## replayed the rows of every state are only read once.
+    def rowCells(self, row):
+        if self.cycleLength is not None:
+            key = (self.stateIndex, row)
+            if key not in self.rowCache:
+                self.rowCache[key] = self.readRow(row)
+
+            return self.rowCache[key]
+
+        return self.readRow(row)
+
+    ## Reads the columns and states of the occupied cells in a row.
+    def readRow(self, row):
+        if self.bits is not None:
+            columns = self.bits.rowIndices(row)
+            return columns, np.ones(len(columns), dtype=np.uint8)
+
+        values = self.gameBoard[row]
+        columns = np.flatnonzero(values)
+        return columns, values[columns]
+
+    ## Makes the freshly written back buffer the current board.
+    def swap(self):
+        self.front = 1 - self.front
+
+    ## Copies source rolled by one cell (shift is 1 or -1) along axis into out,
+    ## wrapping at the edges. Works like np.roll without making a new array.
+    def roll(self, source, shift, axis, out):
+        source = np.swapaxes(source, 0, axis)
+        out = np.swapaxes(out, 0, axis)
+        if shift > 0:
+            np.copyto(out[1:], source[:-1])
+            np.copyto(out[0], source[-1])
+        else:
+            np.copyto(out[:-1], source[1:])
+            np.copyto(out[-1], source[0])
+
+    ## Counts the alive neighbors in every cell's Moore neighborhood at once.
+    ## The alive cells are copied into a board padded with its own wrapped
+    ## edges, and the eight shifted views of it are summed into self.count.
+    ## Leaves the alive cells in self.mask for the rules to use.
+    def countNeighbors(self):
+        count = self.count
+        padded = self.padded
+        np.equal(self.gameBoard, 1, out=self.mask)
+        if self.size == 1:
+            count.fill(0)
+            return count
+
+        np.copyto(padded[1:-1,1:-1], self.mask.view(np.uint8))
+        np.copyto(padded[0,1:-1], padded[-2,1:-1])
+        np.copyto(padded[-1,1:-1], padded[1,1:-1])
+        np.copyto(padded[:,0], padded[:,-2])
+        np.copyto(padded[:,-1], padded[:,1])
+        np.add(padded[:-2,:-2], padded[:-2,1:-1], out=count)
+        np.add(count, padded[:-2,2:], out=count)
+        np.add(count, padded[1:-1,:-2], out=count)
+        np.add(count, padded[1:-1,2:], out=count)
+        np.add(count, padded[2:,:-2], out=count)
+        np.add(count, padded[2:,1:-1], out=count)
+        np.add(count, padded[2:,2:], out=count)
         return count
 
-    ## Returns whether or not there is an alive cell at (x,y).
-    def organismAt(self, x, y):
-        if self.gameBoard[x][y] == 1:
-            return True
-        else:
-            return False
+    ## Returns the 8 entry lookup table of a 1-D rule. Entry n is the new
+    ## state of a cell whose (left, center, right) neighborhood reads as the 3
+    ## bit number n. The table is built once and kept until the rule changes.
+    def oneDTable(self, rule):
+        rule = int(rule)
+        if rule != self.oneDRule:
+            self.oneDRule = rule
+            self.oneDRuleTable = np.array([(rule >> n) & 1 for n in range(8)],
+                dtype=np.uint8)
+
+        return self.oneDRuleTable
+
+    ## Computes the row following prev (alive cells are 1) into out with a
+    ## single lookup of every cell's neighborhood in the rule table. The row
+    ## scratch buffers are index typed so the lookup needs no conversion.
+    def oneDRow(self, table, prev, out):
+        row = self.row
+        pattern = self.rowTemp
+        np.copyto(row[1:-1], prev)
+        row[0] = row[-2]
+        row[-1] = row[1]
+        np.left_shift(row[:-2], 2, out=pattern)
+        np.bitwise_or(pattern, row[2:], out=pattern)
+        np.left_shift(row[1:-1], 1, out=row[1:-1])
+        np.bitwise_or(pattern, row[1:-1], out=pattern)
+        np.take(table, pattern, out=out, mode='clip')
 
     ## Function that updates the automata based on the specified 1-D rule.
+    ## Only the current row changes, so it is written straight into the
+    ## current board from the row above it.
     def oneDUpdate(self, rule):
-        binRule = bin(int(rule))[2:].zfill(8)
-        for i in range(self.size):
-            prevVal = []
-            for j in range(i-1,i+2):
-                curj = j % self.size
-                prevVal.append(self.organismAt((self.currentNote-1)%self.size,
-                    curj))
-
-            while switch(prevVal):
-                if case([1,1,1]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[0]
-                    break
-                if case([1,1,0]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[1]
-                    break
-                if case([1,0,1]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[2]
-                    break
-                if case([1,0,0]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[3]
-                    break
-                if case([0,1,1]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[4]
-                    break
-                if case([0,1,0]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[5]
-                    break
-                if case([0,0,1]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[6]
-                    break
-                if case([0,0,0]):
-                    self.gameBoardTemp[self.currentNote][i] = binRule[7]
-                    break
-                print("The 1D rules broke. What did you do?")
-                break
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
-
-    ## Function to update the automata according to Conway's Game of Life.
-    def conwaysUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                count = self.countneighbors(i,j)
-                if self.organismAt(i,j):
-                    if count not in [2,3]:
-                        self.gameBoardTemp[i][j] = 0
-                else:
-                    if count == 3:
-                        self.gameBoardTemp[i][j] = 1
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
+        np.equal(self.gameBoard[(self.currentNote-1)%self.size], 1,
+            out=self.mask[0])
+        self.oneDRow(self.oneDTable(rule), self.mask[0],
+            self.gameBoard[self.currentNote])
+
+    ## Generates the next count rows of a 1-D rule at once, starting from the
+    ## row above the current one, without changing the board. Used to look
+    ## ahead or render a whole sheet (count = size) offline.
+    def oneDRows(self, rule, count, out = None):
+        table = self.oneDTable(rule)
+        if out is None:
+            out = np.zeros((count, self.size), dtype=np.uint8)
+
+        prev = (self.gameBoard[(self.currentNote-1)%self.size] == 1).view(
+            np.uint8)
+        for i in range(count):
+            self.oneDRow(table, prev, out[i])
+            prev = out[i]
+
+        return out
+
+    ## Updates the cellular automata according to a compiled outer totalistic
+    ## rule (see Rules.py). Every cell's state and neighbor count are combined
+    ## into an index, and the whole next board is taken from the rule table at
+    ## once.
+    def ruleUpdate(self, rule):
+        count = self.countNeighbors()
+        index = self.index
+        np.copyto(index, self.gameBoard)
+        np.multiply(index, 9, out=index)
+        np.add(index, count, out=index)
+        np.take(rule.table, index, out=self.gameBoardTemp, mode='clip')
+        self.swap()
 
     ## Function that does not update the cellular automata.
-    ## Copies the gameboard.
     def noUpdate(self):
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
+        pass
+
+    ## Slides the board by one cell along axis, wrapping at the edges.
+    def slide(self, shift, axis):
+        np.equal(self.gameBoard, 1, out=self.mask)
+        self.roll(self.mask, shift, axis, self.gameBoardTemp)
+        self.swap()
 
     ## Slides the cellular automata 1 cell to the right on each update.
     def rightUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                curx = (j-1) % self.size
-                if self.organismAt(i,curx):
-                    self.gameBoardTemp[i][j] = 1
-                else:
-                    self.gameBoardTemp[i][j] = 0
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
+        self.slide(*SLIDES["Right"])
 
     ## Slides the cellular automata 1 cell to the left on each update.
     def leftUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                curx = (j+1) % self.size
-                if self.organismAt(i,curx):
-                    self.gameBoardTemp[i][j] = 1
-                else:
-                    self.gameBoardTemp[i][j] = 0
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
+        self.slide(*SLIDES["Left"])
 
     ## Slides the cellular automata 1 cell down on each update.
     def downUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                cury = (i-1) % self.size
-                if self.organismAt(cury,j):
-                    self.gameBoardTemp[i][j] = 1
-                else:
-                    self.gameBoardTemp[i][j] = 0
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
+        self.slide(*SLIDES["Down"])
 
     ## Slides the cellular automata 1 cell up on each update.
     def upUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                cury = (i+1) % self.size
-                if self.organismAt(cury,j):
-                    self.gameBoardTemp[i][j] = 1
-                else:
-                    self.gameBoardTemp[i][j] = 0
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
-
-    ## Updates the cellular automata according to the rules of Brian's Brain.
-    def bBUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                count = self.countneighbors(i,j)
-                while switch(self.gameBoard[i][j]):
-                    if case(1):
-                        self.gameBoardTemp[i][j] = 2
-                        break
-                    if case(2):
-                        self.gameBoardTemp[i][j] = 0
-                        break
-                    if case(0):
-                        if count == 2:
-                            self.gameBoardTemp[i][j] = 1
-
-                        break
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
-
-    ## Updates the cellular automata according to the rules of seeds.
-    def seedsUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                count = self.countneighbors(i,j)
-                if not self.organismAt(i,j):
-                    if count == 2:
-                        self.gameBoardTemp[i][j] = 1
-                else:
-                    self.gameBoardTemp[i][j] = 0
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
+        self.slide(*SLIDES["Up"])
+
+    ## Finds the ants (cells in states 2-9) on the board, in row major order.
+    ## The whole board is only scanned when Langton's Ant starts, after that
+    ## every step keeps the ant list up to date itself.
+    def findAnts(self):
+        board = self.gameBoard
+        np.greater_equal(board, 2, out=self.mask)
+        np.less_equal(board, 9, out=self.maskTemp)
+        np.logical_and(self.mask, self.maskTemp, out=self.mask)
+        self.ants = np.flatnonzero(self.mask)
 
     ## Updates the cellular automata according to the rules of Langton's Ant.
+    ## The ants are kept as a list of cell positions, and each ant's state
+    ## holds its heading: states 2-5 are ants standing on an alive cell, 6-9
+    ## on a dead one, and (state - 2) % 4 is the direction it moves next.
+    ## Every ant clears or sets the cell it leaves and lands on its neighbor.
+    ## When ants collide the later write in row major order wins, exactly as
+    ## if the board was walked cell by cell. Only the ants and the cells they
+    ## touch are read or written, so a step costs O(number of ants) and the
+    ## board stays up to date for play and the visualizer.
     def langtonsUpdate(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                current = self.gameBoard[i][j]
-                while switch(current):
-                    if case(2):
-                        self.gameBoardTemp[i][j] = 0
-                        if self.gameBoard[(i+1)%self.size][j] in [0,6,7,8,9]:
-                            self.gameBoardTemp[(i+1)%self.size][j] = 9
-                        else:
-                            self.gameBoardTemp[(i+1)%self.size][j] = 3
-                        break
-                    if case(3):
-                        self.gameBoardTemp[i][j] = 0
-                        if self.gameBoard[i][(j-1)%self.size] in [0,6,7,8,9]:
-                            self.gameBoardTemp[i][(j-1)%self.size] = 6
-                        else:
-                            self.gameBoardTemp[i][(j-1)%self.size] = 4
-                        break
-                    if case(4):
-                        self.gameBoardTemp[i][j] = 0
-                        if self.gameBoard[(i-1)%self.size][j] in [0,6,7,8,9]:
-                            self.gameBoardTemp[(i-1)%self.size][j] = 7
-                        else:
-                            self.gameBoardTemp[(i-1)%self.size][j] = 5
-                        break
-                    if case(5):
-                        self.gameBoardTemp[i][j] = 0
-                        if self.gameBoard[i][(j+1)%self.size] in [0,6,7,8,9]:
-                            self.gameBoardTemp[i][(j+1)%self.size] = 8
-                        else:
-                            self.gameBoardTemp[i][(j+1)%self.size] = 2
-                        break
-                    if case(6):
-                        self.gameBoardTemp[i][j] = 1
-                        if self.gameBoard[(i+1)%self.size][j] in [1,2,3,4,5]:
-                            self.gameBoardTemp[(i+1)%self.size][j] = 3
-                        else:
-                            self.gameBoardTemp[(i+1)%self.size][j] = 9
-                        break
-                    if case(7):
-                        self.gameBoardTemp[i][j] = 1
-                        if self.gameBoard[i][(j-1)%self.size] in [1,2,3,4,5]:
-                            self.gameBoardTemp[i][(j-1)%self.size] = 4
-                        else:
-                            self.gameBoardTemp[i][(j-1)%self.size] = 6
-                        break
-                    if case(8):
-                        self.gameBoardTemp[i][j] = 1
-                        if self.gameBoard[(i-1)%self.size][j] in [1,2,3,4,5]:
-                            self.gameBoardTemp[(i-1)%self.size][j] = 5
-                        else:
-                            self.gameBoardTemp[(i-1)%self.size][j] = 7
-                        break
-                    if case(9):
-                        self.gameBoardTemp[i][j] = 1
-                        if self.gameBoard[i][(j+1)%self.size] in [1,2,3,4,5]:
-                            self.gameBoardTemp[i][(j+1)%self.size] = 2
-                        else:
-                            self.gameBoardTemp[i][(j+1)%self.size] = 8
-                        break
-                    break
-
-
-        self.gameBoard = copy.deepcopy(self.gameBoardTemp)
-
-    ## General update function. Calls the proper update function based on the
-    ## the specified update type.
+        if self.ants is None:
+            self.findAnts()
+
+        ants = self.ants
+        if len(ants) == 0:
+            return
+
+        board = self.gameBoard.reshape(-1)
+        states = board[ants].astype(int)
+        heading = (states - 2) % 4
+        rows = (ants // self.size + LANGTON_ROW_STEP[heading]) % self.size
+        columns = (ants % self.size + LANGTON_COLUMN_STEP[heading]) % self.size
+        targets = rows * self.size + columns
+        onAlive = np.isin(board[targets], (1, 2, 3, 4, 5))
+        cells = np.empty(2 * len(ants), dtype=int)
+        cells[0::2] = ants
+        cells[1::2] = targets
+        values = np.empty(2 * len(ants), dtype=int)
+        values[0::2] = states >= 6
+        values[1::2] = LANGTON_ARRIVALS[onAlive.astype(int), heading]
+        cells, last = np.unique(cells[::-1], return_index=True)
+        values = values[::-1][last]
+        board[cells] = values
+        self.ants = cells[values >= 2]
+
+    ## Clears the remembered states and any cycle found in them.
+    def forget(self):
+        self.history = {} if self.keepHistory else None
+        self.period = None
+        self.periodNote = None
+        self.states = None
+        self.stateIndex = None
+        self.rowCache = {}
+        self.cycleLength = None
+        self.transientLength = None
+
+    ## The current board, packed or not, as it is kept.
+    def state(self):
+        if self.bits is not None:
+            return self.bits.rows
+
+        return self.gameBoard
+
+    ## Puts a saved state back on the board.
+    def restore(self, state):
+        if self.bits is not None:
+            np.copyto(self.bits.rows, state)
+            self.bitsChanged = True
+        else:
+            np.copyto(self.gameBoard, state)
+        self.ants = None
+
+    ## Remembers the current state by a hash of its bytes and the current
+    ## row, hashing the board in place. Once a hash comes up again the steps
+    ## since its first visit may be a cycle, and the states of one period are
+    ## saved as they are computed. If the state after them is the first one
+    ## again the automata is in a cycle, and those states are replayed from
+    ## then on. Remembering stops after historySteps steps, or if one period
+    ## takes more than historyLimit bytes.
+    def remember(self):
+        if self.history is None:
+            return
+
+        state = self.state()
+        if self.states is not None:
+            if len(self.states) < self.period:
+                self.states.append(state.copy())
+                return
+
+            if (self.currentNote == self.periodNote and
+                np.array_equal(self.states[0], state)):
+                self.cycleLength = self.period
+                self.stateIndex = 0
+                self.messages.append("Cycle found! Repeats every " +
+                    str(self.cycleLength) + " steps after " +
+                    str(self.transientLength) + " steps.")
+            else:
+                self.history = None
+                self.states = None
+            return
+
+        key = (hashlib.sha1(state).digest(), self.currentNote)
+        index = self.history.get(key)
+        if index is not None:
+            self.transientLength = index
+            self.period = len(self.history) - index
+            if self.period * state.nbytes > self.historyLimit:
+                self.history = None
+            else:
+                self.states = [state.copy()]
+                self.periodNote = self.currentNote
+            return
+
+        if len(self.history) >= self.historySteps:
+            self.history = None
+            return
+
+        self.history[key] = len(self.history)
+
+    ## Returns the messages for the message box gathered while updating, and
+    ## forgets them. Whoever runs the automata writes them, from the GUI
+    ## thread (see Score.py).
+    def takeMessages(self):
+        messages = self.messages
+        self.messages = []
+        return messages
+
+    ## Moves to the next state of the cycle without computing it.
+    def replay(self):
+        self.stateIndex = (self.stateIndex + 1) % self.cycleLength
+        self.restore(self.states[self.stateIndex])
+
+    ## General update function. Once the automata is known to cycle the saved
+    ## states are replayed, otherwise the next state is computed by step and
+    ## remembered. Langton's Ant is never remembered: moving the ants costs
+    ## less than hashing or restoring the whole board.
     def update(self, type, oneDRule):
+        if self.cycleLength is not None:
+            self.replay()
+            return
+
+        self.step(type, oneDRule)
+        if type != "Langton's Ant":
+            self.remember()
+
+    ## Computes the next state. Calls the proper update function based on the
+    ## the specified update type. Named outer totalistic rules, and custom
+    ## rules given in the rule entry, all go through ruleUpdate.
+    def step(self, type, oneDRule):
+        if type != "Langton's Ant":
+            self.ants = None
+
+        if self.bits is not None:
+            if self.packedUpdate(type, oneDRule):
+                self.bitsChanged = True
+                return
+
+            self.unpack()
+
+        if type in Rules.NAMED_RULES:
+            self.ruleUpdate(Rules.compileRule(type))
+            return
+
         while switch(type):
-            if case("Conways"):
-                self.conwaysUpdate()
+            if case("Custom Rule"):
+                self.ruleUpdate(Rules.compileRule(oneDRule))
                 break
             if case("Up"):
                 self.upUpdate()
@@ -296,97 +447,102 @@ class SoundAutomata:
             if case("1D"):
                 self.oneDUpdate(oneDRule)
                 break
-            if case("Brian's Brain"):
-                self.bBUpdate()
-                break
-            if case("Seeds"):
-                self.seedsUpdate()
-                break
             if case("Langton's Ant"):
                 self.langtonsUpdate()
                 break
-            print "Not a valid update type."
+            print("Not a valid update type.")
             break
 
-    ## Speeds up the audio in snd_array by a factor.
-    def speedx(self, snd_array, factor):
-        indices = np.round(np.arange(0, len(snd_array), factor))
-        indices = indices[indices < len(snd_array)].astype(int)
-        return snd_array[indices]
+    ## Switches from the packed board to the uint8 board for good.
+    def unpack(self):
+        self.gameBoard
+        self.bits = None
+
+    ## Updates a packed board. Returns False if the update type has more than
+    ## two states, in which case update switches to the uint8 board for good.
+    def packedUpdate(self, type, oneDRule):
+        if type in Rules.NAMED_RULES or type == "Custom Rule":
+            rule = Rules.compileRule(oneDRule if type == "Custom Rule" else
+                type)
+            if rule.states != 2:
+                return False
+            self.bits.ruleUpdate(rule)
+        elif type in SLIDES:
+            self.bits.slide(*SLIDES[type])
+        elif type == "1D":
+            self.bits.oneDRow(self.oneDTable(oneDRule), self.currentNote)
+        elif type != "No Update":
+            return False
 
-    ## Generates audio files of all of the specified pitches based on the
-    ## original audio file. Sound length can be normalized.
-    def generateNotes(self):
-        self.parent.write("Generating notes...")
-        for i in range(-36,60):
-            for key in self.key:
-                if i in key:
-                    if not os.path.exists(self.basicNote[:-4] + os.path.sep +
-                        str(i) + '.wav'):
-                        factor = 2**(1.0 * i / 12.0)
-                        if self.lengthAdjusted:
-                            (samplerate,smp)=paulstretch.load_wav(
-                                self.basicNote)
-                            paulstretch.paulstretch(samplerate, smp, factor,
-                                self.windowSize,
-                                self.basicNote[:-4]+"temp"+".wav")
-                            note = pgm.Sound(self.basicNote[:-4]+"temp"+".wav")
-                        else:
-                            note = pgm.Sound(self.basicNote)
-
-                        note.set_volume(0)
-                        note.play()
-                        basicNoteArray = pgsa.array(note)
-                        basicNoteResampled = []
-                        for ch in range(basicNoteArray.shape[1]):
-                            sound_channel = basicNoteArray[:,ch]
-                            basicNoteResampled.append(np.array(
-                                self.speedx(sound_channel, factor)))
-
-                        basicNoteResampled = np.transpose(np.array(
-                            basicNoteResampled)).copy(order='C')
-                        noteOut = pgsa.make_sound(basicNoteResampled.astype(
-                            basicNoteArray.dtype))
-                        noteFile = wave.open(self.basicNote[:-4] + os.path.sep +
-                            str(i) + '.wav', 'w')
-                        noteFile.setframerate(44100)
-                        noteFile.setnchannels(2)
-                        noteFile.setsampwidth(2)
-                        noteFile.writeframesraw(noteOut.get_raw())
-                        noteFile.close()
-                        self.parent.write(self.parent.notes[
-                            i%len(self.parent.notes)] + "(" +
-                            str(i//len(self.parent.notes)+5) + ") Generated!")
-
-        if os.path.exists(self.basicNote[:-4]+"temp"+".wav"):
-            os.remove(self.basicNote[:-4]+"temp"+".wav")
-
-    ## Plays one time step of the cellular automata.
-    def play(self, notelen, num, musicCheck):
-        if musicCheck:
-            toPlay = []
-            for i in range(len(self.gameBoard[self.currentNote])):
-                if self.gameBoard[self.currentNote][i] > 0:
-                    toPlay.append(i)
-
-            if num > len(toPlay):
-                num = len(toPlay)
-
-            n = len(toPlay)-num
-            toPlay = toPlay[n//2:len(toPlay)-n//2]
-            for j in range(num):
-                if self.gameBoard[self.currentNote][toPlay[j]]:
-                    self.noteArray[self.currentKey][toPlay[j]%len(
-                        self.key[self.currentKey])].set_volume(1/self.gameBoard[
-                        self.currentNote][toPlay[j]])
-                    self.noteArray[self.currentKey][toPlay[j]%len(self.key[
-                        self.currentKey])].play(0, notelen)
+        return True
 
+    ## Measures the peak bytes allocated while taking a number of updates of
+    ## the given type. One update is taken first so only the steady state is
+    ## measured. No arrays are created while stepping, so this stays within
+    ## NumPy's fixed size casting buffers (tens of kilobytes) whatever the
+    ## board size, plus about a hundred bytes of history per update until a
+    ## cycle is found (see remember).
+    ## Ant moves allocate per ant. Returns None without tracemalloc.
+    def stepAllocations(self, type, oneDRule, steps = 10):
+        if tracemalloc is None:
+            return None
+
+        self.update(type, oneDRule)
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            for i in range(steps):
+                self.update(type, oneDRule)
+
+            return tracemalloc.get_traced_memory()[1] - start
+        finally:
+            tracemalloc.stop()
+
+    ## Generates every pitch in the key that is not in the note bank yet.
+    ## Notes are otherwise generated the first time they are played, with the
+    ## next chord of the progression generated ahead in the background.
+    def generateNotes(self):
+        self.noteBank.generate([i for key in self.key for i in key])
+
+    ## Starts generating the notes of a chord in the background.
+    def prefetch(self, chord):
+        if chord < len(self.key):
+            self.noteBank.prefetch(self.key[chord])
+
+    ## Generates the notes played by a list of events (see Score.py) that are
+    ## not in the note bank yet, without reporting, so playback finds them
+    ## ready. May be called from any thread.
+    def generateEvents(self, events):
+        self.noteBank.generate([self.key[event["key"]][event["note"]]
+            for event in events], False)
+
+    ## Returns the samples of a note of a chord, generating it if needed.
+    def noteSample(self, chord, note):
+        return self.noteBank.sample(self.key[chord][note])
+
+    ## Picks the notes the current row plays: up to num of its occupied cells,
+    ## taken from the middle of the row. Returns the index of each note in the
+    ## current chord and its volume (1 / the cell's state).
+    def selectNotes(self, num):
+        toPlay, values = self.rowCells(self.currentNote)
+        if num > len(toPlay):
+            num = len(toPlay)
+
+        n = len(toPlay)-num
+        toPlay = toPlay[n//2:n//2 + num]
+        volumes = 1.0/values[n//2:n//2 + num]
+        return toPlay % len(self.key[self.currentKey]), volumes
+
+    ## Moves on to the next row.
+    def advance(self):
         self.currentNote = (self.currentNote + 1) % self.size
 
-    ## Moves the progression forward one chord. Will wrap around.
-    def updateKey(self, val):
-        self.currentKey = self.parent.progression[val]
+    ## Moves to a chord of the key. Starts generating the chord after it in
+    ## the progression, if given.
+    def updateKey(self, chord, nextChord = None):
+        self.currentKey = chord
+        if nextChord is not None:
+            self.prefetch(nextChord)
 
 ## -----------------------------------------------------------------------------
 ## switch ----------------------------------------------------------------------
@@ -1,155 +1,328 @@
-#!/usr/bin/env python
-#
-# Paul's Extreme Sound Stretch (Paulstretch) - Python version
-#
-# by Nasca Octavian PAUL, Targu Mures, Romania
-# http://www.paulnasca.com/
-#
-# http://hypermammut.sourceforge.net/paulstretch/
-#
-# this file is released under Public Domain
-#
-#
-
-## I made some slight modifications, primarily making the script usable as a
-## library.
-
-
-import sys
-from numpy import *
-import scipy.io.wavfile
-import wave
-from optparse import OptionParser
-
-def load_wav(filename):
-    try:
-        wavedata=scipy.io.wavfile.read(filename)
-        samplerate=int(wavedata[0])
-        smp=wavedata[1]*(1.0/32768.0)
-        smp=smp.transpose()
-        if len(smp.shape)==1: #convert to stereo
-            smp=tile(smp,(2,1))
-        return (samplerate,smp)
-    except:
-        print ("Error loading wav: "+filename)
-        return None
-
-
-
-def optimize_windowsize(n):
-    orig_n=n
-    while True:
-        n=orig_n
-        while (n%2)==0:
-            n/=2
-        while (n%3)==0:
-            n/=3
-        while (n%5)==0:
-            n/=5
-
-        if n<2:
-            break
-        orig_n+=1
-    return orig_n
-
-def paulstretch(samplerate,smp,stretch,windowsize_seconds,outfilename):
-    nchannels=smp.shape[0]
-
-    outfile=wave.open(outfilename,"wb")
-    outfile.setsampwidth(2)
-    outfile.setframerate(samplerate)
-    outfile.setnchannels(nchannels)
-
-    #make sure that windowsize is even and larger than 16
-    windowsize=int(windowsize_seconds*samplerate)
-    if windowsize<16:
-        windowsize=16
-    windowsize=optimize_windowsize(windowsize)
-    windowsize=int(windowsize/2)*2
-    half_windowsize=int(windowsize/2)
-
-    #correct the end of the smp
-    nsamples=smp.shape[1]
-    end_size=int(samplerate*0.05)
-    if end_size<16:
-        end_size=16
-
-    smp[:,nsamples-end_size:nsamples]*=linspace(1,0,end_size)
-
-
-    #compute the displacement inside the input file
-    start_pos=0.0
-    displace_pos=(windowsize*0.5)/stretch
-
-    #create Window window
-#    window=0.5-cos(arange(windowsize,dtype='float')*2.0*pi/(windowsize-1))*0.5
-    window=pow(1.0-pow(linspace(-1.0,1.0,windowsize),2.0),1.25)
-
-    old_windowed_buf=zeros((2,windowsize))
-#    hinv_sqrt2=(1+sqrt(0.5))*0.5
-#    hinv_buf=2.0*(hinv_sqrt2-(1.0-hinv_sqrt2)*cos(arange(half_windowsize,dtype='float')*2.0*pi/half_windowsize))/hinv_sqrt2
-
-    while True:
-        #get the windowed buffer
-        istart_pos=int(floor(start_pos))
-        buf=smp[:,istart_pos:istart_pos+windowsize]
-        if buf.shape[1]<windowsize:
-            buf=append(buf,zeros((2,windowsize-buf.shape[1])),1)
-        buf=buf*window
-
-        #get the amplitudes of the frequency components and discard the phases
-        freqs=abs(fft.rfft(buf))
-
-        #randomize the phases by multiplication with a random complex number with modulus=1
-        ph=random.uniform(0,2*pi,(nchannels,freqs.shape[1]))*1j
-        freqs=freqs*exp(ph)
-
-        #do the inverse FFT
-        buf=fft.irfft(freqs)
-
-        #window again the output buffer
-        buf*=window
-
-        #overlap-add the output
-        output=buf[:,0:half_windowsize]+old_windowed_buf[:,half_windowsize:windowsize]
-        old_windowed_buf=buf
-
-        #remove the resulted amplitude modulation
-        #update: there is no need to the new windowing function
-        #output*=hinv_buf
-
-        #clamp the values to -1..1
-        output[output>1.0]=1.0
-        output[output<-1.0]=-1.0
-
-        #write the output to wav file
-        outfile.writeframes(int16(output.ravel(1)*32767.0).tostring())
-
-        start_pos+=displace_pos
-        if start_pos>=nsamples:
-            ## print ("100 %")
-            break
-        ## sys.stdout.write ("%d %% \r" % int(100.0*start_pos/nsamples))
-        ## sys.stdout.flush()
-
-    outfile.close()
-
-########################################
-if __name__ == "__main__":
-    print ("Paul's Extreme Sound Stretch (Paulstretch) - Python version 20141220")
-    print ("by Nasca Octavian PAUL, Targu Mures, Romania\n")
-    parser = OptionParser(usage="usage: %prog [options] input_wav output_wav")
-    parser.add_option("-s", "--stretch", dest="stretch",help="stretch amount (1.0 = no stretch)",type="float",default=8.0)
-    parser.add_option("-w", "--window_size", dest="window_size",help="window size (seconds)",type="float",default=0.25)
-    (options, args) = parser.parse_args()
-
-
-    if (len(args)<2) or (options.stretch<=0.0) or (options.window_size<=0.001):
-        print ("Error in command line parameters. Run this program with --help for help.")
-        sys.exit(1)
-
-    print ("stretch amount = %g" % options.stretch)
-    print ("window size = %g seconds" % options.window_size)
-    (samplerate,smp)=load_wav(args[0])
-
-    paulstretch(samplerate,smp,options.stretch,options.window_size,args[1])
+#!/usr/bin/env python
+#
+# Paul's Extreme Sound Stretch (Paulstretch) - Python version
+#
+# by Nasca Octavian PAUL, Targu Mures, Romania
+# http://www.paulnasca.com/
+#
+# http://hypermammut.sourceforge.net/paulstretch/
+#
+# this file is released under Public Domain
+#
+#
+
+## I made some slight modifications, primarily making the script usable as a
+## library.
+
+
+import sys
+from numpy import *
+import scipy.io.wavfile
+import wave
+import threading
+from optparse import OptionParser
+
+def load_wav(filename):
+    try:
+        wavedata=scipy.io.wavfile.read(filename)
+        samplerate=int(wavedata[0])
+        smp=wavedata[1]*(1.0/32768.0)
+        smp=smp.transpose()
+        if len(smp.shape)==1: #convert to stereo
+            smp=tile(smp,(2,1))
+        return (samplerate,smp)
+    except:
+        print ("Error loading wav: "+filename)
+        return None
+
+
+
+def optimize_windowsize(n):
+    orig_n=n
+    while True:
+        n=orig_n
+        while (n%2)==0:
+            n/=2
+        while (n%3)==0:
+            n/=3
+        while (n%5)==0:
+            n/=5
+
+        if n<2:
+            break
+        orig_n+=1
+    return orig_n
+
+def get_windowsize(samplerate,windowsize_seconds):
+    #make sure that windowsize is even and larger than 16
+    windowsize=int(windowsize_seconds*samplerate)
+    if windowsize<16:
+        windowsize=16
+    windowsize=optimize_windowsize(windowsize)
+    windowsize=int(windowsize/2)*2
+    return windowsize
+
+## Opens a wav file without reading it: returns (samplerate, smp) where smp
+## is a memory mapped view of the samples, shape (channels, samples), with
+## mono files shown as stereo like load_wav does. Slices of it are read from
+## disk only when used.
+def open_wav(filename):
+    try:
+        try:
+            (samplerate,data)=scipy.io.wavfile.read(filename,mmap=True)
+        except ValueError: #formats that can not be mapped, such as 24 bit
+            (samplerate,data)=scipy.io.wavfile.read(filename)
+        if len(data.shape)==1: #convert to stereo
+            smp=broadcast_to(data,(2,data.shape[0]))
+        else:
+            smp=data.transpose()
+        return (int(samplerate),smp)
+    except:
+        print ("Error loading wav: "+filename)
+        return None
+
+def get_fade(samplerate,nsamples):
+    #correct the end of the smp
+    end_size=int(samplerate*0.05)
+    if end_size<16:
+        end_size=16
+    if end_size>nsamples:
+        end_size=nsamples
+    return (nsamples-end_size,linspace(1,0,end_size))
+
+## Copies samples as a wav file holds them (integers, or floats in -1..1)
+## into out as floats in -1..1.
+def to_float(data,out):
+    out[...]=data
+    if data.dtype==uint8: #8 bit wav files are unsigned
+        out-=128.0
+    if issubdtype(data.dtype,integer):
+        out*=1.0/2**(8*data.dtype.itemsize-1)
+    return out
+
+## Reads samples start..end of smp into block as floats in -1..1, faded out
+## at the end of the whole sound, padded with silence past it.
+def read_block(smp,start,end,fade_start,fade,block):
+    nsamples=smp.shape[1]
+    block.fill(0.0)
+    stop=end
+    if stop>nsamples:
+        stop=nsamples
+    if stop>start:
+        to_float(smp[:,start:stop],block[:,0:stop-start])
+    if stop>fade_start:
+        first=start
+        if first<fade_start:
+            first=fade_start
+        block[:,first-start:stop-start]*=fade[first-fade_start:stop-fade_start]
+    return block
+
+## Stretches sounds with one window size at one sample rate. The window size,
+## the window and the work buffers of a block of block_frames windows are made
+## once and reused by every sound it stretches, so stretching many notes with
+## the same settings only pays for them once. A Stretcher stretches one sound
+## at a time.
+class Stretcher(object):
+    def __init__(self,samplerate,windowsize_seconds,block_frames=16):
+        self.samplerate=samplerate
+        self.windowsize=get_windowsize(samplerate,windowsize_seconds)
+        self.half_windowsize=int(self.windowsize/2)
+        self.block_frames=block_frames
+
+        #create Window window
+        self.window=pow(1.0-pow(linspace(-1.0,1.0,self.windowsize),2.0),1.25)
+        self.nchannels=None
+
+    ## Makes the work buffers for a number of channels.
+    def allocate(self,nchannels):
+        if self.nchannels==nchannels:
+            return
+        self.nchannels=nchannels
+        frames=(nchannels,self.block_frames)
+        nfreqs=self.half_windowsize+1
+        self.input=zeros((nchannels,0))
+        self.buf=zeros(frames+(self.windowsize,))
+        self.freqs=zeros(frames+(nfreqs,))
+        self.trig=zeros(frames+(nfreqs,))
+        self.spectrum=zeros(frames+(nfreqs,),dtype=complex)
+        self.output=zeros(frames+(self.half_windowsize,))
+        self.old_windowed_buf=zeros((nchannels,self.half_windowsize))
+
+    ## Returns a buffer for span input samples, grown when it is too small.
+    def input_block(self,span):
+        if self.input.shape[1]<span:
+            self.input=zeros((self.nchannels,span))
+        return self.input[:,0:span]
+
+    ## Stretches smp (shape (channels, samples), floats in -1..1 or integer
+    ## samples, such as the memory mapped samples of open_wav) and yields the
+    ## stretched samples, clamped to -1..1, a block of block_frames windows at
+    ## a time. Only the input under those windows is read, so memory stays in
+    ## proportion to the window size however long the sound is. Every window
+    ## of a block is cut, transformed, phase randomized and overlap-added at
+    ## once. seed seeds the random phases so the same seed gives the same
+    ## output. smp is not changed. With a pitch other than 1 every frequency
+    ## is also multiplied by pitch, in the same pass, by moving the amplitudes
+    ## of each window to other frequencies (see shift_bins).
+    def blocks(self,smp,stretch,seed=None,pitch=1.0):
+        rng=random.RandomState(seed)
+        shift=None
+        if pitch!=1.0:
+            shift=shift_bins(self.half_windowsize+1,pitch)
+        nchannels=smp.shape[0]
+        nsamples=smp.shape[1]
+        windowsize=self.windowsize
+        half_windowsize=self.half_windowsize
+        window=self.window
+        self.allocate(nchannels)
+        (fade_start,fade)=get_fade(self.samplerate,nsamples)
+
+        #start of every window in the input file
+        displace_pos=(windowsize*0.5)/stretch
+        nframes=int(ceil(nsamples/displace_pos))
+        if nframes<1:
+            nframes=1
+        starts=floor(arange(nframes)*displace_pos).astype(int)
+
+        old_windowed_buf=self.old_windowed_buf
+        old_windowed_buf.fill(0.0)
+        for first in range(0,nframes,self.block_frames):
+            block_starts=starts[first:first+self.block_frames]
+            nblock=len(block_starts)
+            buf=self.buf[:,0:nblock]
+            freqs=self.freqs[:,0:nblock]
+            trig=self.trig[:,0:nblock]
+            spectrum=self.spectrum[:,0:nblock]
+            output=self.output[:,0:nblock]
+
+            #get the windowed buffers, shape (channels, frames, windowsize),
+            #reading the input under the block at once while the windows
+            #overlap and each window on its own once they are far apart
+            offset=block_starts[0]
+            span=block_starts[-1]+windowsize-offset
+            if span<=self.block_frames*windowsize:
+                padded=read_block(smp,offset,offset+span,fade_start,fade,
+                    self.input_block(span))
+                for i in range(nblock):
+                    start=block_starts[i]-offset
+                    buf[:,i]=padded[:,start:start+windowsize]
+            else:
+                for i in range(nblock):
+                    read_block(smp,block_starts[i],block_starts[i]+windowsize,
+                        fade_start,fade,buf[:,i])
+            buf*=window
+
+            #get the amplitudes of the frequency components and randomize the
+            #phases by multiplication with a random complex number with
+            #modulus=1
+            absolute(fft.rfft(buf),out=freqs)
+            if shift is not None:
+                (low,high,weight,gain)=shift
+                multiply(freqs[:,:,low],1.0-weight,out=trig)
+                trig+=freqs[:,:,high]*weight
+                multiply(trig,gain,out=freqs)
+            ph=rng.uniform(0,2*pi,(nblock,nchannels,freqs.shape[2]))
+            ph=ph.transpose(1,0,2)
+            multiply(freqs,cos(ph,out=trig),out=spectrum.real)
+            multiply(freqs,sin(ph,out=trig),out=spectrum.imag)
+
+            #do the inverse FFT, window again the output buffers and
+            #overlap-add them
+            buf=fft.irfft(spectrum,windowsize)
+            buf*=window
+            output[...]=buf[:,:,0:half_windowsize]
+            output[:,0]+=old_windowed_buf
+            output[:,1:]+=buf[:,:-1,half_windowsize:windowsize]
+            old_windowed_buf[...]=buf[:,-1,half_windowsize:windowsize]
+
+            #clamp the values to -1..1
+            yield clip(output.reshape(nchannels,-1),-1.0,1.0)
+
+    ## Stretches smp and returns the stretched samples, clamped to -1..1, as
+    ## one array. See blocks.
+    def stretch(self,smp,stretch,seed=None,pitch=1.0):
+        return concatenate(list(self.blocks(smp,stretch,seed,pitch)),1)
+
+## Returns how to move the amplitudes of nfreqs frequency bins so that every
+## frequency is multiplied by pitch: bin k takes the amplitude at k / pitch,
+## interpolated between bins low and high by weight, or nothing past the last
+## bin. gain keeps the loudness, as moving the amplitudes widens (or narrows)
+## every peak by pitch.
+def shift_bins(nfreqs,pitch):
+    source=arange(nfreqs)/float(pitch)
+    low=floor(source).astype(int)
+    weight=source-low
+    gain=where(source<=nfreqs-1,1.0/sqrt(pitch),0.0)
+    low[low>nfreqs-1]=nfreqs-1
+    high=low+1
+    high[high>nfreqs-1]=nfreqs-1
+    return (low,high,weight,gain)
+
+## Stretchers already made, by (samplerate, windowsize, block_frames), kept
+## apart for every thread so no two sounds share one at once.
+stretchers=threading.local()
+
+## Returns the Stretcher for a sample rate and window size, made on first use.
+def get_stretcher(samplerate,windowsize_seconds,block_frames=16):
+    if not hasattr(stretchers,"cache"):
+        stretchers.cache={}
+    key=(samplerate,get_windowsize(samplerate,windowsize_seconds),
+        block_frames)
+    if key not in stretchers.cache:
+        stretchers.cache[key]=Stretcher(samplerate,windowsize_seconds,
+            block_frames)
+    return stretchers.cache[key]
+
+## Stretches smp and yields the stretched samples a block at a time. See
+## Stretcher.blocks.
+def stretch_blocks(samplerate,smp,stretch,windowsize_seconds,seed=None,
+    block_frames=16):
+    return get_stretcher(samplerate,windowsize_seconds,block_frames).blocks(
+        smp,stretch,seed)
+
+## Stretches smp in memory and returns the stretched samples, clamped to
+## -1..1, as one array. See Stretcher.blocks.
+def stretch_array(samplerate,smp,stretch,windowsize_seconds,seed=None):
+    return get_stretcher(samplerate,windowsize_seconds).stretch(smp,stretch,
+        seed)
+
+## Multiplies every frequency of smp by pitch, keeping its length, in one
+## pass. Returns the shifted samples, clamped to -1..1. See Stretcher.blocks.
+def pitch_array(samplerate,smp,pitch,windowsize_seconds,seed=None):
+    return get_stretcher(samplerate,windowsize_seconds).stretch(smp,1.0,
+        seed,pitch)
+
+## Writes blocks of samples (shape (channels, samples), floats in -1..1) to a
+## 16 bit wav file as they come.
+def write_wav(filename,samplerate,nchannels,blocks):
+    outfile=wave.open(filename,"wb")
+    outfile.setsampwidth(2)
+    outfile.setframerate(samplerate)
+    outfile.setnchannels(nchannels)
+    for output in blocks:
+        outfile.writeframes(int16(output.T.ravel()*32767.0).tobytes())
+    outfile.close()
+
+def paulstretch(samplerate,smp,stretch,windowsize_seconds,outfilename,seed=None):
+    write_wav(outfilename,samplerate,smp.shape[0],stretch_blocks(samplerate,
+        smp,stretch,windowsize_seconds,seed))
+
+########################################
+if __name__ == "__main__":
+    print ("Paul's Extreme Sound Stretch (Paulstretch) - Python version 20141220")
+    print ("by Nasca Octavian PAUL, Targu Mures, Romania\n")
+    parser = OptionParser(usage="usage: %prog [options] input_wav output_wav")
+    parser.add_option("-s", "--stretch", dest="stretch",help="stretch amount (1.0 = no stretch)",type="float",default=8.0)
+    parser.add_option("-w", "--window_size", dest="window_size",help="window size (seconds)",type="float",default=0.25)
+    (options, args) = parser.parse_args()
+
+
+    if (len(args)<2) or (options.stretch<=0.0) or (options.window_size<=0.001):
+        print ("Error in command line parameters. Run this program with --help for help.")
+        sys.exit(1)
+
+    print ("stretch amount = %g" % options.stretch)
+    print ("window size = %g seconds" % options.window_size)
+    (samplerate,smp)=open_wav(args[0])
+
+    paulstretch(samplerate,smp,options.stretch,options.window_size,args[1])
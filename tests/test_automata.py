@@ -0,0 +1,197 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_automata.py
+
+## Checks the vectorized update rules of SoundAutomata against plain loops
+## written the way the original per cell updates were. Run with pytest, or as
+## a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+import tempfile                     ## Used for a place for the notes.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import SoundAutomata                ## The automata under test.
+try:
+    import tracemalloc              ## Used to measure allocations.
+except ImportError:
+    tracemalloc = None
+
+## Stand In Parent -------------------------------------------------------------
+## The few parts of MainApplication the automata uses.
+class Parent(object):
+    notes = ["C", "C#/Df", "D", "D#/Ef", "E", "F", "F#/Gf", "G", "G#/Af",
+        "A", "A#/Bf", "B"]
+
+    ## Class constructor. Initializes all values.
+    def __init__(self):
+        self.log = []
+
+    ## Keeps what is written.
+    def write(self, string):
+        self.log.append(string)
+
+## -----------------------------------------------------------------------------
+## Reference Updates -----------------------------------------------------------
+## Number of alive (state 1) neighbors of a cell, wrapping at the edges.
+def countNeighbors(board, i, j):
+    size = len(board)
+    count = 0
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            if (di or dj) and board[(i+di)%size][(j+dj)%size] == 1:
+                count += 1
+
+    return count
+
+## Birth counts, survival counts and number of states of the named rules.
+NAMED_RULES = {"Conways": ([3], [2, 3], 2), "Seeds": ([2], [], 2),
+    "Brian's Brain": ([2], [], 3)}
+
+## Outer totalistic rule (B/S or Generations) one cell at a time.
+def referenceRule(board, birth, survive, states):
+    temp = board.copy()
+    for i in range(len(board)):
+        for j in range(len(board)):
+            count = countNeighbors(board, i, j)
+            if board[i][j] == 0:
+                if count in birth:
+                    temp[i][j] = 1
+            elif board[i][j] == 1:
+                if count not in survive:
+                    temp[i][j] = 2 if states > 2 else 0
+            elif states > 2:
+                temp[i][j] = (int(board[i][j]) + 1) % states
+
+    return temp
+
+## 1-D rule: row is computed from the row above it.
+def referenceOneD(board, rule, row):
+    size = len(board)
+    temp = board.copy()
+    above = board[(row-1)%size] == 1
+    for i in range(size):
+        pattern = (4 * above[(i-1)%size] + 2 * above[i] +
+            above[(i+1)%size])
+        temp[row][i] = (int(rule) >> pattern) & 1
+
+    return temp
+
+## Langton's Ant, cell by cell in row order. Ants on dead cells are states 2
+## to 5, on alive cells 6 to 9, heading down, left, up and right.
+def referenceLangton(board):
+    size = len(board)
+    moves = {2: (1, 0), 3: (0, -1), 4: (-1, 0), 5: (0, 1)}
+    onDead = {2: 9, 3: 6, 4: 7, 5: 8, 6: 9, 7: 6, 8: 7, 9: 8}
+    onAlive = {2: 3, 3: 4, 4: 5, 5: 2, 6: 3, 7: 4, 8: 5, 9: 2}
+    temp = board.copy()
+    for i in range(size):
+        for j in range(size):
+            state = board[i][j]
+            if state < 2:
+                continue
+
+            di, dj = moves[(state - 2) % 4 + 2]
+            target = ((i+di)%size, (j+dj)%size)
+            temp[i][j] = 0 if state <= 5 else 1
+            if board[target] in (1, 2, 3, 4, 5):
+                temp[target] = onAlive[state]
+            else:
+                temp[target] = onDead[state]
+
+    return temp
+
+## Shift and axis of each slide.
+SLIDES = {"Up": (-1, 0), "Down": (1, 0), "Left": (-1, 1), "Right": (1, 1)}
+
+## Slides one cell: Up, Down, Left or Right.
+def referenceSlide(board, type):
+    shift, axis = SLIDES[type]
+    return np.roll(board == 1, shift, axis).astype(board.dtype)
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## Makes an automata without notes, so no sound is loaded.
+def makeAutomata(seed, packed = False, history = True):
+    return SoundAutomata.SoundAutomata(Parent(), seed, os.path.join(
+        tempfile.gettempdir(), "none.wav"), [], packed = packed,
+            history = history)
+
+## Moves an automata on to its next row.
+def advance(automata):
+    automata.currentNote = (automata.currentNote + 1) % automata.size
+
+## Random boards with states below states, of count sizes from sizes.
+def boards(states, count = 6, seed = 1, sizes = range(2, 13)):
+    rng = np.random.RandomState(seed)
+    return [rng.randint(states, size=(size, size)).astype(np.uint8)
+        for size in rng.choice(sizes, size=count)]
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## The named outer totalistic rules.
+def test_rules():
+    for type, (birth, survive, states) in sorted(NAMED_RULES.items()):
+        for board in boards(states):
+            automata = makeAutomata(board)
+            expected = board.copy()
+            for step in range(8):
+                automata.update(type, "30")
+                expected = referenceRule(expected, birth, survive, states)
+                assert np.array_equal(automata.gameBoard, expected), (type,
+                    step)
+
+## Slides and the 1-D rules, one row per step for 1D.
+def test_slides_and_oneD():
+    for board in boards(2):
+        for type in SLIDES:
+            automata = makeAutomata(board)
+            expected = board.copy()
+            for step in range(5):
+                automata.update(type, "30")
+                expected = referenceSlide(expected, type)
+                assert np.array_equal(automata.gameBoard, expected)
+
+        for rule in ("30", "90", "110"):
+            automata = makeAutomata(board)
+            expected = board.copy()
+            for step in range(3 * len(board)):
+                advance(automata)
+                automata.update("1D", rule)
+                expected = referenceOneD(expected, rule, automata.currentNote)
+                assert np.array_equal(automata.gameBoard, expected)
+
+## Langton's Ant with several ants, some running into each other.
+def test_langton():
+    rng = np.random.RandomState(2)
+    for board in boards(2, 10):
+        ants = rng.randint(len(board)**2, size=3)
+        board.reshape(-1)[ants] = rng.randint(2, 10, size=3)
+        automata = makeAutomata(board)
+        expected = board.copy()
+        for step in range(40):
+            automata.update("Langton's Ant", "30")
+            expected = referenceLangton(expected)
+            assert np.array_equal(automata.gameBoard, expected), step
+
+## Updating allocates no arrays once running, whatever the board size.
+def test_update_allocations():
+    if tracemalloc is None:
+        return
+
+    board = np.random.RandomState(3).randint(2, size=(1024, 1024))
+    for type in ("Conways", "Brian's Brain", "Right"):
+        allocated = makeAutomata(board).stepAllocations(type, "30")
+        assert allocated < 2**18, (type, allocated)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
@@ -0,0 +1,83 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_bitboard.py
+
+## Checks that the bit packed board steps the same as the uint8 board, on
+## boards that fit in one word and on boards whose rows carry across words.
+## Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import BitBoard                     ## The packed board under test.
+from test_automata import SLIDES, makeAutomata, advance, boards
+
+## Board sizes around the word boundaries, up to three words a row.
+WIDE_SIZES = [63, 64, 65, 100, 127, 128, 129, 150]
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## Random two state boards, small and wide.
+def twoStateBoards():
+    return boards(2) + [boards(2, 1, size, [size])[0] for size in WIDE_SIZES]
+
+## Steps a packed and an unpacked automata side by side and checks that
+## their boards and rows stay the same.
+def checkPacked(board, type, rule, steps):
+    packed = makeAutomata(board, True)
+    plain = makeAutomata(board)
+    assert packed.bits is not None
+    for step in range(steps):
+        if type == "1D":
+            advance(packed)
+            advance(plain)
+        packed.update(type, rule)
+        plain.update(type, rule)
+        row = step % len(board)
+        assert np.array_equal(packed.rowCells(row)[0],
+            plain.rowCells(row)[0]), (type, len(board), step)
+        assert np.array_equal(packed.gameBoard, plain.gameBoard), (type,
+            len(board), step)
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## Packing and unpacking gives back the alive cells.
+def test_pack_round_trip():
+    for board in twoStateBoards():
+        bits = BitBoard.BitBoard(board)
+        out = np.zeros_like(board)
+        bits.unpack(out)
+        assert np.array_equal(out, board)
+        for row in range(len(board)):
+            assert np.array_equal(bits.rowIndices(row),
+                np.flatnonzero(board[row]))
+
+## Two state rules, the slides and 1D.
+def test_packed_updates():
+    for board in twoStateBoards():
+        for type, rule in (("Conways", "30"), ("Seeds", "30"),
+            ("Custom Rule", "B36/S23"), ("1D", "110")):
+            checkPacked(board, type, rule, 6)
+        for type in SLIDES:
+            checkPacked(board, type, "30", 3)
+
+## Seeds with more than two states are kept on the uint8 board.
+def test_many_states_not_packed():
+    board = boards(3, 1)[0]
+    board[0, 0] = 2
+    automata = makeAutomata(board, True)
+    assert automata.bits is None
+    assert np.array_equal(automata.gameBoard, board)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
@@ -0,0 +1,101 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_cycles.py
+
+## Checks that replaying a cycle of the automata gives the same boards as
+## computing them, and that finding one is reported from the thread taking
+## the beats. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import Score                        ## Used to run the automata.
+from test_automata import makeAutomata, advance, boards
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## Replaying a found cycle gives the same boards and rows as computing them.
+def test_cycles():
+    found = 0
+    for type in ("Conways", "Brian's Brain", "Right", "1D"):
+        for packed in (False, True):
+            for board in boards(3 if type == "Brian's Brain" else 2):
+                a = makeAutomata(board, packed)
+                b = makeAutomata(board, packed, history = False)
+                for step in range(200):
+                    if type == "1D":
+                        advance(a)
+                        advance(b)
+                    a.update(type, "90")
+                    b.update(type, "90")
+                    assert np.array_equal(a.gameBoard, b.gameBoard)
+                    row = step % a.size
+                    assert np.array_equal(a.rowCells(row)[0],
+                        b.rowCells(row)[0])
+
+                found += a.cycleLength is not None
+
+    assert found > 0
+
+## Once a cycle is found only the states of one period are kept. Boards that
+## do not come back within historySteps steps stop being remembered.
+def test_history_limit():
+    automata = makeAutomata(boards(2, 1, 4, [8])[0])
+    for step in range(20):
+        automata.update("Right", "30")
+    assert automata.cycleLength == 8
+    assert len(automata.states) == 8
+
+    automata = makeAutomata(boards(2, 1, 4, [16])[0])
+    automata.historySteps = 4
+    for step in range(40):
+        automata.update("Right", "30")
+    assert automata.cycleLength is None
+    assert automata.history is None
+
+## The cycle report is handed over by the producer ahead of the beat it came
+## up on, not written from its thread, and compileScore writes it once done.
+def test_cycle_messages():
+    automata = makeAutomata(boards(2, 1, 4, [4])[0])
+    automata.key = [[0]]
+    producer = Score.BeatProducer(automata, "Right", "30", 12, 0.1, [100], 4,
+        False, lookahead = 2)
+    producer.start()
+    beats = []
+    messages = []
+    beat = producer.get()
+    while beat is not None:
+        if isinstance(beat, str):
+            messages.append(beat)
+        else:
+            beats.append(beat)
+        beat = producer.get()
+    assert len(beats) == 48
+    assert len(messages) == 1 and messages[0].startswith("Cycle found!")
+    assert automata.parent.log == []
+
+    automata = makeAutomata(boards(2, 1, 4, [4])[0])
+    automata.key = [[0]]
+    Score.compileScore(automata, "Right", "30", 12, 0.1, [100], 4, False)
+    assert [line for line in automata.parent.log
+        if line.startswith("Cycle found!")] == messages
+
+    try:
+        Score.BeatProducer(automata, "Right", "30", 12, 0.1, [100], 4,
+            lookahead = 0)
+        assert False
+    except ValueError:
+        pass
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
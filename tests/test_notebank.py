@@ -0,0 +1,75 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_notebank.py
+
+## Checks that notes generated across the worker pool are the ones generated
+## one at a time, and that notes prefetched in the background are saved to
+## the cache in batches. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+import shutil                       ## Used to remove temporary files.
+import tempfile                     ## Used for temporary files.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import NoteBank                     ## The note bank under test.
+import NoteCache                    ## Used to cache the notes.
+from test_automata import Parent
+
+## Sound the notes are generated from.
+SOUND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), "pizzicatoc4.wav")
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## A pool of workers generates the same notes as a single process, and is
+## started once per bank.
+def test_pool_matches_serial():
+    pitches = [-5, 0, 4, 7, 12]
+    serial = NoteBank.NoteBank(Parent(), SOUND, workers = 1)
+    serial.generate(pitches)
+    pooled = NoteBank.NoteBank(Parent(), SOUND, workers = 2)
+    try:
+        pooled.generate(pitches[:3])
+        pool = pooled.pool
+        pooled.generate(pitches)
+        assert pooled.pool is pool
+    finally:
+        pooled.close()
+
+    assert serial.pool is None and pooled.pool is None
+    for pitch in pitches:
+        assert np.array_equal(pooled.sample(pitch), serial.sample(pitch))
+
+## A prefetched chord is generated in the background without writing to the
+## parent, and only saved to the cache once a batch is full or on flush.
+def test_prefetch_and_flush():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = NoteCache.NoteCache(directory)
+        parent = Parent()
+        bank = NoteBank.NoteBank(parent, SOUND, cache = cache, workers = 1)
+        bank.saveBatch = 4
+        bank.prefetch([0, 4, 7]).join()
+        assert bank.prefetch([0, 4, 7]) is None
+        assert parent.log == []
+        assert cache.load(bank.cacheKey) == {}
+        bank.generate([12, 16], False)
+        assert sorted(cache.load(bank.cacheKey)) == [0, 4, 7, 12, 16]
+        bank.generate([19], False)
+        bank.flush()
+        assert sorted(cache.load(bank.cacheKey)) == [0, 4, 7, 12, 16, 19]
+    finally:
+        shutil.rmtree(directory)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
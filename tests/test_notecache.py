@@ -0,0 +1,87 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_notecache.py
+
+## Checks that the note cache gives back what was saved and evicts the least
+## recently used banks. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+import shutil                       ## Used to remove temporary files.
+import tempfile                     ## Used for temporary files.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import NoteCache                    ## The cache under test.
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## A bank of a few random notes.
+def randomNotes(seed):
+    rng = np.random.RandomState(seed)
+    return dict((pitch, rng.randint(-32768, 32767, size=(4000, 2)).astype(
+        np.int16)) for pitch in (0, 4, 7))
+
+## Sets when a file was last used, in seconds.
+def setUsed(path, used):
+    os.utime(path, (used, used))
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## Saved notes load back the same, and keys change with the settings.
+def test_round_trip():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = NoteCache.NoteCache(directory)
+        sound = os.path.join(directory, "sound.wav")
+        with open(sound, 'wb') as soundFile:
+            soundFile.write(b'not really a sound')
+        key = cache.key(sound, False, 0.5, 44100)
+        assert key == cache.key(sound, False, 0.25, 44100)
+        assert key != cache.key(sound, True, 0.5, 44100)
+        assert key != cache.key(sound, False, 0.5, 48000)
+        assert key != cache.key(sound, False, 0.5, 44100, "fast")
+
+        assert cache.load(key) == {}
+        notes = randomNotes(0)
+        cache.save(key, notes)
+        loaded = cache.load(key)
+        assert sorted(loaded) == sorted(notes)
+        for pitch in notes:
+            assert np.array_equal(loaded[pitch], notes[pitch])
+        assert [name for name in os.listdir(directory)
+            if name.endswith('.tmp')] == []
+    finally:
+        shutil.rmtree(directory)
+
+## Once the cache is full the least recently used banks are removed, never
+## the one just saved, and loading a bank counts as using it.
+def test_lru_eviction():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = NoteCache.NoteCache(directory, 2**62)
+        for i in range(3):
+            cache.save(str(i), randomNotes(i))
+            setUsed(cache.path(str(i)), 1000 + i)
+        cache.load("0")
+        size = os.path.getsize(cache.path("0"))
+        cache.maxBytes = 3 * size
+        cache.save("3", randomNotes(3))
+        assert sorted(os.listdir(directory)) == ["0.npz", "2.npz", "3.npz"]
+
+        cache.maxBytes = size
+        cache.save("4", randomNotes(4))
+        assert os.listdir(directory) == ["4.npz"]
+    finally:
+        shutil.rmtree(directory)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
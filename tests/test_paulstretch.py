@@ -0,0 +1,137 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_paulstretch.py
+
+## Checks the vectorized paulstretch against the original loop over windows,
+## with the same random phases. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+import shutil                       ## Used to remove temporary files.
+import tempfile                     ## Used for temporary files.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+import scipy.io.wavfile             ## Used to write .wav files.
+
+import paulstretch                  ## The stretcher under test.
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## The original paulstretch loop, one window at a time, returning the output
+## instead of writing it. Phases are drawn from a RandomState seeded with seed.
+def referenceStretch(samplerate, smp, stretch, windowsize_seconds, seed):
+    rng = np.random.RandomState(seed)
+    smp = smp.copy()
+    nchannels = smp.shape[0]
+    nsamples = smp.shape[1]
+    windowsize = paulstretch.get_windowsize(samplerate, windowsize_seconds)
+    half_windowsize = windowsize // 2
+    end_size = max(int(samplerate * 0.05), 16)
+    smp[:,nsamples-end_size:nsamples] *= np.linspace(1, 0, end_size)
+    window = (1.0 - np.linspace(-1.0, 1.0, windowsize)**2.0)**1.25
+    old_windowed_buf = np.zeros((nchannels, windowsize))
+    output = []
+    start_pos = 0.0
+    while True:
+        istart_pos = int(np.floor(start_pos))
+        buf = smp[:,istart_pos:istart_pos+windowsize]
+        if buf.shape[1] < windowsize:
+            buf = np.append(buf, np.zeros((nchannels,
+                windowsize-buf.shape[1])), 1)
+        freqs = np.abs(np.fft.rfft(buf * window))
+        ph = rng.uniform(0, 2 * np.pi, (nchannels, freqs.shape[1]))
+        buf = np.fft.irfft(freqs * np.exp(1j * ph)) * window
+        output.append(np.clip(buf[:,0:half_windowsize] +
+            old_windowed_buf[:,half_windowsize:windowsize], -1.0, 1.0))
+        old_windowed_buf = buf
+        start_pos += (windowsize * 0.5) / stretch
+        if start_pos >= nsamples:
+            break
+
+    return np.concatenate(output, 1)
+
+## Random stereo samples in -0.5..0.5.
+def randomSound(length = 20000, seed = 0):
+    return np.random.RandomState(seed).rand(2, length) - 0.5
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## With the same seed the windows are stretched exactly as the loop did.
+def test_matches_reference():
+    smp = randomSound()
+    for stretch in (0.25, 0.5, 1.0, 2.0, 8.0):
+        for windowsize in (0.01, 0.05):
+            expected = referenceStretch(8000, smp, stretch, windowsize, 3)
+            got = paulstretch.stretch_array(8000, smp, stretch, windowsize,
+                seed=3)
+            assert got.shape == expected.shape, (stretch, windowsize)
+            assert np.abs(got - expected).max() < 1e-9, (stretch, windowsize)
+
+## The same seed gives the same output, another seed another, and the input
+## is not changed.
+def test_seeded():
+    smp = randomSound()
+    before = smp.copy()
+    a = paulstretch.stretch_array(8000, smp, 2.0, 0.05, seed=1)
+    b = paulstretch.stretch_array(8000, smp, 2.0, 0.05, seed=1)
+    c = paulstretch.stretch_array(8000, smp, 2.0, 0.05, seed=2)
+    assert np.array_equal(a, b)
+    assert not np.array_equal(a, c)
+    assert np.array_equal(smp, before)
+
+## Shifting the pitch keeps the length and moves the peak of a sine to the
+## shifted frequency.
+def test_pitch():
+    smp = np.tile(0.5 * np.sin(2 * np.pi * 440.0 / 8000 * np.arange(16000)),
+        (2, 1))
+    for pitch in (0.5, 2**(7 / 12.0), 2.0):
+        shifted = paulstretch.pitch_array(8000, smp, pitch, 0.1, seed=6)
+        assert abs(shifted.shape[1] - smp.shape[1]) < 1000
+        spectrum = np.abs(np.fft.rfft(shifted[0]))
+        peak = np.argmax(spectrum) * 8000.0 / shifted.shape[1]
+        assert abs(peak - 440.0 * pitch) < 15.0, (pitch, peak)
+
+## Stretching the memory mapped samples of a file, block by block, gives what
+## stretching the whole file read into memory does, for mono and stereo
+## files.
+def test_open_wav():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "sound.wav")
+        sound = np.round(randomSound() * 32767).astype(np.int16)
+        for data in (sound.T, sound[0]):
+            scipy.io.wavfile.write(path, 8000, data)
+            rate, loaded = paulstretch.load_wav(path)
+            rate, mapped = paulstretch.open_wav(path)
+            assert rate == 8000
+            assert mapped.dtype == np.int16
+            assert np.array_equal(mapped * (1.0 / 32768.0), loaded)
+            expected = paulstretch.stretch_array(rate, loaded, 3.0, 0.05,
+                seed=4)
+            blocks = list(paulstretch.stretch_blocks(rate, mapped, 3.0, 0.05,
+                seed=4))
+            assert len(blocks) > 1
+            assert np.abs(np.concatenate(blocks, 1) - expected).max() < 1e-12
+            del mapped
+    finally:
+        shutil.rmtree(directory)
+
+## The input read for a block stays the size of its windows however far apart
+## they are.
+def test_input_span():
+    stretcher = paulstretch.Stretcher(8000, 0.05)
+    for stretch in (0.01, 0.1, 0.5, 4.0):
+        stretcher.stretch(randomSound(), stretch, seed=5)
+        assert stretcher.input.shape[1] <= (stretcher.block_frames *
+            stretcher.windowsize)
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
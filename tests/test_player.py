@@ -0,0 +1,226 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_player.py
+
+## Checks that the player draws every beat on time, and that pausing and
+## resuming moves the beats still to come. Time, the event loop, the
+## producer and the mixer are stand ins the test drives by hand. Run with
+## pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import Player                       ## The player under test.
+import Scheduler                    ## Used for the clock.
+import Score                        ## Used for note events.
+from test_scheduler import Clock
+
+## -----------------------------------------------------------------------------
+## Stand Ins -------------------------------------------------------------------
+## The part of a Tk widget the player uses. Runs the pending callback when
+## the test moves the clock past it.
+class Widget(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, clock):
+        self.clock = clock
+        self.jobs = {}
+        self.count = 0
+
+    ## Runs callback after ms milliseconds.
+    def after(self, ms, callback):
+        self.count += 1
+        self.jobs[self.count] = (self.clock.now + ms / 1000.0, callback)
+        return self.count
+
+    ## Forgets a callback.
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    ## Moves the clock to the next callback and runs it. Returns False if
+    ## there is none.
+    def runNext(self):
+        if not self.jobs:
+            return False
+
+        job = min(self.jobs, key=lambda job: self.jobs[job][0])
+        due, callback = self.jobs.pop(job)
+        self.clock.now = max(self.clock.now, due)
+        callback()
+        return True
+
+## Hands out a list of beats, messages and the None that ends the piece.
+class Producer(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, beats):
+        self.beats = list(beats) + [None]
+        self.started = False
+        self.stopped = False
+
+    ## Starts producing.
+    def start(self):
+        self.started = True
+
+    ## Returns the next beat.
+    def get(self, block = True):
+        return self.beats.pop(0)
+
+    ## Stops producing.
+    def stop(self):
+        self.stopped = True
+
+## Keeps the notes scheduled on it. Its clock is the test's.
+class Mixer(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, clock):
+        self.clock = clock
+        self.samplerate = 1000
+        self.scheduled = []
+        self.cleared = 0
+        self.voices = self
+
+    ## Samples played so far.
+    @property
+    def position(self):
+        return int(round(self.clock.now * self.samplerate))
+
+    ## Nothing to start.
+    def start(self):
+        pass
+
+    ## Nothing to stop.
+    def stop(self, wait = False):
+        pass
+
+    ## Keeps the events.
+    def schedule(self, events, sample):
+        self.scheduled.append(events.copy())
+
+    ## Counts the times the notes still to come were taken back.
+    def clear(self):
+        self.cleared += 1
+
+    ## Voice statistics as a line for the message box.
+    def report(self):
+        return "voices"
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## count beats of one note each, with a message before the second.
+def makeBeats(count, interval):
+    beats = []
+    for beat in range(count):
+        events = np.zeros(1, dtype=Score.EVENT)
+        events["time"] = beat * interval
+        events["note"] = beat
+        if beat == 1:
+            beats.append("Cycle found!")
+        beats.append((beat * interval, events, beat, beat))
+
+    return beats
+
+## Makes a player of count beats on the test's clock. Returns the player,
+## its stand ins and the lists of drawn beats (time, frame) and written lines.
+def makePlayer(count, interval = 0.5):
+    clock = Clock()
+    widget = Widget(clock)
+    producer = Producer(makeBeats(count, interval))
+    mixer = Mixer(clock)
+    drawn = []
+    written = []
+    clockBefore = Scheduler.clock
+    Scheduler.clock = clock
+    try:
+        player = Player.Player(widget, producer, mixer, None, interval,
+            lambda frame, row: drawn.append((clock.now, frame)),
+                written.append)
+        player.scheduler.clock = clock
+    finally:
+        Scheduler.clock = clockBefore
+    return player, widget, producer, mixer, drawn, written
+
+## Starts the player with the scheduler module on the test's clock.
+def start(player, clock):
+    clockBefore = Scheduler.clock
+    Scheduler.clock = clock
+    try:
+        player.start()
+    finally:
+        Scheduler.clock = clockBefore
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## Every beat is drawn at its deadline and its note handed to the mixer at
+## the same time on the mixer's clock. Messages are written as they come.
+def test_plays_on_time():
+    player, widget, producer, mixer, drawn, written = makePlayer(4)
+    clock = widget.clock
+    start(player, clock)
+    while widget.runNext():
+        pass
+
+    assert producer.started and producer.stopped
+    assert player.state == "stopped"
+    assert [frame for time, frame in drawn] == [0, 1, 2, 3]
+    for beat, (time, frame) in enumerate(drawn):
+        assert abs(time - (100.1 + 0.5 * beat)) < 0.002
+    assert [round(events["time"][0], 6) for events in mixer.scheduled] == [
+        round(100.1 + 0.5 * beat, 6) for beat in range(4)]
+    assert written == ["Cycle found!", player.scheduler.report(), "voices"]
+
+## Pausing takes the next beat back from the mixer and stops drawing.
+## Resuming schedules it again, lead seconds after the resume, and every
+## later beat keeps its distance from it.
+def test_pause_and_resume():
+    player, widget, producer, mixer, drawn, written = makePlayer(4)
+    clock = widget.clock
+    start(player, clock)
+    while len(drawn) < 2:
+        widget.runNext()
+    player.pause()
+    assert player.state == "paused"
+    assert mixer.cleared == 1
+    assert not widget.jobs
+
+    clock.now += 10.0
+    start(player, clock)
+    assert player.state == "playing"
+    resumed = clock.now
+    while widget.runNext():
+        pass
+
+    assert [frame for time, frame in drawn] == [0, 1, 2, 3]
+    assert abs(drawn[2][0] - (resumed + 0.1)) < 0.002
+    assert abs(drawn[3][0] - (resumed + 0.6)) < 0.002
+    assert [round(events["time"][0], 6) for events in mixer.scheduled[3:]] == [
+        round(resumed + 0.1, 6), round(resumed + 0.6, 6)]
+    assert player.scheduler.lateness()[1] < 0.002
+
+## An error while drawing stops playback and is written.
+def test_draw_error():
+    player, widget, producer, mixer, drawn, written = makePlayer(3)
+
+    ## Fails on the first beat.
+    def draw(frame, row):
+        raise ValueError("no window")
+
+    player.draw = draw
+    start(player, widget.clock)
+    while widget.runNext():
+        pass
+
+    assert player.state == "stopped"
+    assert producer.stopped
+    assert written[0] == "Playback stopped! ValueError: no window"
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
@@ -0,0 +1,174 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_render.py
+
+## Checks that every way of mixing a score gives the same samples: the offline
+## renderer, the streaming renderer and the real time mixer. Run with pytest,
+## or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+import shutil                       ## Used to remove temporary files.
+import tempfile                     ## Used for temporary files.
+import wave                         ## Used to read .wav files.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import Score                        ## Used for note events.
+import Render                       ## The offline renderers under test.
+import Mixer                        ## The real time mixer under test.
+from test_automata import Parent
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## Random notes, [chord][note], and a score of count random events playing
+## them, one event per beat.
+def randomPiece(count = 300, seed = 0):
+    rng = np.random.RandomState(seed)
+    notes = [[(rng.randn(rng.randint(1000, 30000), 2) * 3000).astype(
+        np.int16) for i in range(3)] for chord in range(2)]
+    events = np.zeros(count, dtype=Score.EVENT)
+    events["time"] = np.sort(rng.rand(count) * 4)
+    events["key"] = rng.randint(2, size=count)
+    events["note"] = rng.randint(3, size=count)
+    events["volume"] = 1.0 / rng.randint(1, 4, size=count)
+    events["duration"] = rng.choice([100, 500, 2000], size=count)
+    return notes, Score.Score(events, np.arange(count + 1), 0.0)
+
+## Reads a 16 bit stereo .wav file.
+def readWav(path):
+    inFile = wave.open(path, 'r')
+    frames = inFile.readframes(inFile.getnframes())
+    inFile.close()
+    return np.frombuffer(frames, dtype=np.int16).reshape(-1, 2)
+
+## Keeps every block it is given.
+class ListSink(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self):
+        self.blocks = []
+
+    ## Takes a copy of a block.
+    def write(self, block):
+        self.blocks.append(block.copy())
+
+    ## Nothing to close.
+    def close(self):
+        pass
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## The offline mix adds every note at its onset, cut off after its duration
+## and scaled by its volume.
+def test_mixScore():
+    notes, score = randomPiece(seed = 2)
+    mixed = Render.mixScore(score, notes, 44100)
+    expected = np.zeros(mixed.shape)
+    for event in score.events:
+        onset = int(round(event["time"] * 44100))
+        sample = notes[event["key"]][event["note"]]
+        sample = sample[:int(event["duration"]) * 44100 // 1000]
+        expected[onset:onset+len(sample)] += sample * float(event["volume"])
+
+    assert len(mixed) >= score.beats * score.interval * 44100
+    assert np.abs(mixed - expected).max() < 1e-3
+
+## Many onsets of one sample, added with one FFT, give what adding them one
+## at a time does.
+def test_overlapAdd():
+    rng = np.random.RandomState(4)
+    sample = rng.randn(5000, 2)
+    onsets = rng.randint(20000, size=3000)
+    gains = rng.rand(3000)
+    expected = np.zeros((25000, 2))
+    for onset, gain in zip(onsets, gains):
+        expected[onset:onset+5000] += sample * gain
+
+    out = np.zeros((25000, 2))
+    Render.overlapAdd(out, sample, onsets, gains)
+    assert np.abs(out - expected).max() < 1e-6
+
+## Rendering an automata with a sound writes the whole piece at the sample
+## rate of its notes.
+def test_renderAutomata():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "piece.wav")
+        sound = os.path.join(directory, "sound.wav")
+        shutil.copy(os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), "pizzicatoc4.wav"), sound)
+        seed = np.random.RandomState(3).randint(2, size=(6, 6))
+        Render.renderAutomata(path, seed, sound, [[0, 4, 7], [5, 9, 12]],
+            [0, 1], True, cycles = 2, bpm = 600, parent = Parent())
+        inFile = wave.open(path, 'r')
+        assert inFile.getframerate() == 44100
+        assert inFile.getnframes() >= 2 * 6 * 0.1 * 44100
+        inFile.close()
+        assert readWav(path).any()
+    finally:
+        shutil.rmtree(directory)
+
+## The mixer, fed in two halves, matches the offline mix sample for sample
+## and only pads the last block with silence.
+def test_mixer_matches_mixScore():
+    notes, score = randomPiece()
+    expected = np.clip(Render.mixScore(score, notes, 44100), -32768,
+        32767).astype(np.int16)
+    sink = ListSink()
+    mixer = Mixer.Mixer(sink, blockSize = 512, polyphony = 1000)
+    events = score.events
+    half = events["time"] < 2.0
+    mixer.schedule(events[half], lambda key, note: notes[key][note])
+    mixer.renderUntil(1.0)
+    mixer.schedule(events[~half], lambda key, note: notes[key][note])
+    mixer.renderAll()
+    mixed = np.concatenate(sink.blocks)
+    assert np.array_equal(mixed[:len(expected)], expected)
+    assert not mixed[len(expected):].any()
+    assert len(mixed) - len(expected) < 512
+
+## Streaming the beats into a ring of blocks matches rendering the whole
+## piece at once.
+def test_streamWav_matches_renderWav():
+    notes, score = randomPiece(seed = 1)
+    directory = tempfile.mkdtemp()
+    try:
+        whole = os.path.join(directory, "whole.wav")
+        streamed = os.path.join(directory, "streamed.wav")
+        Render.renderWav(score, notes, whole, 44100)
+        beats = [(score.events["time"][i], score.beatEvents(i))
+            for i in range(score.beats)]
+        Render.streamWav(beats, notes, streamed, 44100, blockSize = 1024)
+        expected = readWav(whole)
+        got = readWav(streamed)
+        assert np.array_equal(got[:len(expected)], expected)
+        assert not got[len(expected):].any()
+    finally:
+        shutil.rmtree(directory)
+
+## A full voice pool steals the oldest or quietest voice, or drops the note.
+def test_voice_stealing():
+    events = np.zeros(3, dtype=Score.EVENT)
+    events["time"] = [0.0, 0.001, 0.002]
+    events["volume"] = [0.5, 0.1, 0.9]
+    events["duration"] = 1000
+    note = np.ones((44100, 2), dtype=np.int16)
+    for steal, kept in (("oldest", [1, 2]), ("quietest", [0, 2]),
+        (None, [0, 1])):
+        mixer = Mixer.Mixer(Mixer.NullSink(), blockSize = 256, polyphony = 2,
+            steal = steal)
+        mixer.schedule(events, lambda key, index: note)
+        mixer.render()
+        voices = mixer.voices
+        assert sorted(voices.order[voices.active].tolist()) == kept
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
@@ -0,0 +1,82 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_resample.py
+
+## Checks the quality tiers of the resampler: the fast tier against the
+## original nearest sample speedx, the others against a sine wave sampled at
+## the new rate. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import Resample                     ## The resampler under test.
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## The original pitch shift of SoundAutomata, one channel at a time.
+def speedx(snd_array, factor):
+    indices = np.round(np.arange(0, len(snd_array), factor))
+    indices = indices[indices < len(snd_array)].astype(int)
+    return snd_array[indices]
+
+## A stereo sine of a frequency (cycles per sample), sampled at positions.
+def sine(frequency, where):
+    wave = np.sin(2 * np.pi * frequency * np.asarray(where))
+    return np.stack((wave, 0.5 * wave), axis=1)
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## The fast tier picks exactly the samples speedx did.
+def test_fast_matches_speedx():
+    samples = np.random.RandomState(0).randint(-32768, 32767,
+        size=(10007, 2)).astype(np.int16)
+    for factor in (2**(-36 / 12.0), 0.5, 2**(-1 / 12.0), 1.0, 2**(7 / 12.0),
+        3.0, 2**(59 / 12.0)):
+        expected = np.transpose([speedx(samples[:,0], factor),
+            speedx(samples[:,1], factor)])
+        assert np.array_equal(Resample.resample(samples, factor, "fast"),
+            expected), factor
+
+## The interpolating tiers give a sample for every position, and every tier
+## keeps the type and channels of the samples.
+def test_lengths_and_types():
+    for samples in (np.zeros((5000, 2), dtype=np.int16), np.zeros(4999)):
+        for factor in (0.3, 1.0, 1.7):
+            for quality in Resample.QUALITIES:
+                out = Resample.resample(samples, factor, quality)
+                if quality != "fast":
+                    assert len(out) == len(Resample.positions(len(samples),
+                        factor))
+                assert out.dtype == samples.dtype
+                assert out.shape[1:] == samples.shape[1:]
+
+## Interpolating tiers follow a sine closely, and sinc only keeps what fits
+## under the new Nyquist frequency.
+def test_interpolation():
+    where = np.arange(20000)
+    for factor in (0.37, 1.5, 2**(5 / 12.0)):
+        samples = sine(0.01, where)
+        expected = sine(0.01, Resample.positions(len(where), factor))
+        middle = slice(100, -100)
+        for quality, tolerance in (("linear", 1e-3), ("sinc", 1e-3)):
+            out = Resample.resample(samples, factor, quality)
+            assert np.abs(out - expected)[middle].max() < tolerance, (
+                quality, factor)
+
+    high = sine(0.4, where)
+    out = Resample.resample(high, 2.0, "sinc")
+    assert np.abs(out[100:-100]).max() < 0.01
+    assert np.abs(Resample.resample(high, 2.0, "fast")).max() > 0.5
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
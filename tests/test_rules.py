@@ -0,0 +1,59 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_rules.py
+
+## Checks the compiled B/S and Generations rules against the plain loops of
+## test_automata.py. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np                  ## Used for arrays.
+
+import Rules                        ## The rule compiler under test.
+from test_automata import NAMED_RULES, referenceRule, makeAutomata, boards
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## Named rules compile to their birth and survival counts.
+def test_named_rules():
+    for name, (birth, survive, states) in NAMED_RULES.items():
+        rule = Rules.compileRule(name)
+        assert (sorted(rule.birth), sorted(rule.survive), rule.states) == (
+            birth, survive, states)
+
+## Custom rules, including Generations rules with more states than fit in a
+## uint8 index, run like the plain loops.
+def test_custom_rules():
+    for notation, states in (("B36/S23", 2), ("B2/S345/C5", 5),
+        ("B2/S/C40", 40), ("B3/S23/C256", 256)):
+        rule = Rules.compileRule(notation)
+        for board in boards(states):
+            automata = makeAutomata(board)
+            expected = board.copy()
+            for step in range(8):
+                automata.update("Custom Rule", notation)
+                expected = referenceRule(expected, rule.birth, rule.survive,
+                    states)
+                assert np.array_equal(automata.gameBoard, expected), (
+                    notation, step)
+
+## Rule notation that can not be compiled is rejected.
+def test_rule_notation():
+    assert Rules.isRule("B3/S23")
+    assert Rules.isRule("b3/s23")
+    assert Rules.isRule("B2/S/C256")
+    assert not Rules.isRule("B3/S23/C300")
+    assert not Rules.isRule("B9/S23")
+    assert not Rules.isRule("Conway")
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")
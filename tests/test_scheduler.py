@@ -0,0 +1,96 @@
+## Colby Jeffries
+## Musical Cellular Automata
+## test_scheduler.py
+
+## Checks the beat deadlines and lateness statistics of the scheduler against
+## a clock the test moves by hand. Run with pytest, or as a script.
+
+## Libraries and Dependencies --------------------------------------------------
+import os                           ## Used for paths.
+import sys                          ## Used to find the application modules.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Scheduler                    ## The scheduler under test.
+
+## -----------------------------------------------------------------------------
+## Helpers ---------------------------------------------------------------------
+## A clock that only moves when told to.
+class Clock(object):
+    ## Class constructor. Initializes all values.
+    def __init__(self, now = 100.0):
+        self.now = now
+
+    ## Returns the time.
+    def __call__(self):
+        return self.now
+
+## -----------------------------------------------------------------------------
+## Tests -----------------------------------------------------------------------
+## Deadlines are counted from the first beat, so late beats do not push the
+## ones after them back.
+def test_deadlines():
+    clock = Clock()
+    scheduler = Scheduler.BeatScheduler(0.5, clock)
+    assert scheduler.remaining() == 0.0
+    assert scheduler.advance() == 0.0
+    assert scheduler.remaining() == 0.5
+    clock.now += 0.7
+    assert abs(scheduler.remaining() + 0.2) < 1e-9
+    assert abs(scheduler.advance() - 0.2) < 1e-9
+    assert abs(scheduler.remaining() - 0.3) < 1e-9
+    assert abs(scheduler.deadline(2) - 101.0) < 1e-9
+
+## A new interval starts from the next beat, whose deadline stays put.
+def test_setInterval():
+    clock = Clock()
+    scheduler = Scheduler.BeatScheduler(0.5, clock)
+    scheduler.remaining()
+    for beat in range(3):
+        scheduler.advance()
+        clock.now += 0.5
+    scheduler.setInterval(0.25)
+    assert abs(scheduler.deadline(3) - 101.5) < 1e-9
+    assert abs(scheduler.deadline(4) - 101.75) < 1e-9
+
+    scheduler = Scheduler.BeatScheduler(0.5, clock)
+    scheduler.setInterval(0.1)
+    assert scheduler.remaining() == 0.0
+    scheduler.advance()
+    assert abs(scheduler.remaining() - 0.1) < 1e-9
+
+## Restarting moves every deadline, without counting the pause as lateness.
+def test_restart():
+    clock = Clock()
+    scheduler = Scheduler.BeatScheduler(0.5, clock)
+    scheduler.restart(clock.now + 0.1)
+    assert abs(scheduler.remaining() - 0.1) < 1e-9
+    clock.now += 0.1
+    scheduler.advance()
+    clock.now += 10.0
+    scheduler.restart(clock.now)
+    assert scheduler.advance() == 0.0
+    assert scheduler.lateness() == (0.0, 0.0)
+
+## Mean and largest lateness, and the line reporting them.
+def test_lateness():
+    clock = Clock()
+    scheduler = Scheduler.BeatScheduler(1.0, clock)
+    assert scheduler.lateness() == (0.0, 0.0)
+    scheduler.remaining()
+    for late in (0.0, 0.004, 0.002):
+        clock.now = scheduler.deadline(scheduler.beat) + late
+        scheduler.advance()
+    mean, largest = scheduler.lateness()
+    assert abs(mean - 0.002) < 1e-9
+    assert abs(largest - 0.004) < 1e-9
+    assert scheduler.report() == ("Beats were 2.0ms late on average, 4.0ms " +
+        "at most.")
+
+## -----------------------------------------------------------------------------
+## Main ------------------------------------------------------------------------
+## If this file is called as a script, runs every test.
+if __name__ == "__main__":
+    for name, test in sorted(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(name + " passed.")